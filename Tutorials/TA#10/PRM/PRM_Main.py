@@ -1,6 +1,11 @@
 # This code was written by Yotam Granov
 
-import random
+import os, sys, random
+
+if __name__ == '__main__':
+    # when run as a script, the RRT package (one directory up) is made importable for PRM_MotionPlanner
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
 from PRM_Geometry import *
 from PRM_MotionPlanner import *
 from PRM_Plotter import *
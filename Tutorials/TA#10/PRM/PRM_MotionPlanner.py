@@ -1,15 +1,29 @@
 # This code was written by Yotam Granov
 
-import random, sys
+import sys
+import numpy as np
 from scipy.spatial import KDTree
 from PRM_Geometry import *
 
-def Create_Samples(map, obstacles, N_samples=100, N_knn=3):
+def Create_Samples(map, obstacles, N_samples=100, N_knn=3, sequence='uniform', seed=None):
+    """
+    Samples collision-free nodes in the C-Space
+    :param map: the map (the samples are drawn within its width and height)
+    :param obstacles: list of obstacles in the C-Space
+    :param N_samples: the number of samples
+    :param N_knn: the number of nearest obstacles each sample is checked against
+    :param sequence: the sequence the samples are drawn from ('uniform', 'halton', 'sobol' or 'stratified')
+    :param seed: seed for the sample sequence
+    :returns: list of the sampled nodes
+    """
+    # the sample sequences are shared with the RRT package (one directory up, which must be importable)
+    from RRT.SampleSequence import SampleSequence
+
+    points = SampleSequence(sequence, dim=2, seed=seed)
+    obs_kd_tree = KDTree([o.center for o in obstacles])
     samples = []
     while len(samples) <= N_samples:
-        tx = random.random() * map.width
-        ty = random.random() * map.height
-        obs_kd_tree = KDTree([o.center for o in obstacles])
+        tx, ty = points.draw_in_box(1, [0, 0], [map.width, map.height])[0].tolist()
 
         dist, idx = obs_kd_tree.query([tx, ty], k=N_knn)        
         no_col = True
@@ -164,4 +178,51 @@ def PRM_Solve(start_node, goal_node, samples, roadmap, PRM_graph, obstacles):
         traj.append(best_path[-1])
 
     print("Finished running Dijkstra's Algorithm on the PRM.\n")
-    return traj
\ No newline at end of file
+    return traj
+
+class Obstacles_Environment:
+    def __init__(self, obstacles):
+        """Exposes the circular PRM obstacles through the collision-checking interface used by the RRT post-processing"""
+        self.centers = np.array([o.center for o in obstacles], dtype=float).reshape(-1, 2)
+        self.radii = np.array([o.radius for o in obstacles], dtype=float)
+
+    def edge_validity_checker_batch(self, edges):
+        """Returns a boolean mask which is true for the edges (an Nx2x2 array) that do not pass through any obstacle"""
+        edges = np.asarray(edges, dtype=float).reshape(-1, 2, 2)
+        p1 = edges[:, None, 0]; d = edges[:, None, 1] - p1
+        # closest point to each obstacle center along each edge
+        t = np.sum((self.centers - p1) * d, axis=2) / np.maximum(np.sum(d * d, axis=2), 1e-12)
+        closest = p1 + np.clip(t, 0, 1)[..., None] * d
+        dists = np.linalg.norm(closest - self.centers, axis=2)
+        return ~np.any(dists <= self.radii, axis=1)
+
+    def compute_distance(self, start_state, end_state):
+        """Returns the Euclidean distance between two states"""
+        return Euclidean_Distance(start_state, end_state)
+
+def PRM_Shortcut(traj, obstacles, mode='both', max_checks=None, seed=None):
+    """
+    Shortens the trajectory found by PRM_Solve
+    :param traj: the trajectory (alternating nodes and edges, from the start node to the goal node)
+    :param obstacles: list of obstacles in the C-Space
+    :param mode: 'greedy', 'random' or 'both'
+    :param max_checks: the maximal number of edges to collision-check (no limit if None)
+    :param seed: seed for the randomized shortcuts
+    :returns: the shortened trajectory (in the same format) and its cost
+    """
+    # the shortcutter is shared with the RRT package (one directory up), which is only required for shortcutting
+    from RRT.PathShortcutter import PathShortcutter
+
+    nodes = [o for o in traj if isinstance(o, Node)]
+    shortcutter = PathShortcutter(Obstacles_Environment(obstacles), max_checks=max_checks, seed=seed)
+    plan, cost = shortcutter.shortcut([n.center for n in nodes], mode=mode)
+
+    # keep the start and goal nodes, and create nodes for the new intermediate states
+    new_nodes = [nodes[0]] + [Node(list(p)) for p in plan[1:-1]] + [nodes[-1]]
+    new_traj = []
+    for i in range(len(new_nodes)-1):
+        new_traj.append(new_nodes[i])
+        new_traj.append(Edge(new_nodes[i], new_nodes[i+1]))
+    new_traj.append(new_nodes[-1])
+    print(f"\tShortcutting reduced the path value to {cost:.3f}")
+    return new_traj, cost
@@ -0,0 +1,193 @@
+# This code was written by Yotam Granov
+
+import numpy as np
+import shapely
+from RRT.MapEnvironment import MapEnvironment
+from RRT.StateSpace import StateSpace
+
+class ArmEnvironment(object):
+    def __init__(self, json_file, link_lengths, start, goal, base=None, weights=None, resolution=None, link_radius=0,
+                 self_collision=True, headless=None, step_size=0.2):
+        '''
+        A planar arm with revolute joints, moving among the obstacles of a map. The states are the joint angles (each relative to
+        the previous link, wrapping around at +-pi), and the distance between them is a weighted Euclidean distance over the
+        angle differences. The environment has the same interface as MapEnvironment, so the RRT planners work on it unchanged.
+        @param json_file The map of the workspace (its start and goal are not used).
+        @param link_lengths The length of each link (one per joint).
+        @param start The start configuration (joint angles).
+        @param goal The goal configuration (joint angles).
+        @param base The position of the first joint (the map's start by default).
+        @param weights The weight of each joint in the distance (by default, the reach from that joint, so that moving
+                       a proximal joint costs more than moving a distal one).
+        @param resolution Edges are checked at poses whose links are at most this far apart in the workspace (1% of the map by default).
+        @param link_radius The half-thickness of the links (the obstacles are inflated by it).
+        @param self_collision If True, non-adjacent links may not cross each other.
+        @param headless If True, the map is not displayed.
+        @param step_size The length of E2 extensions in the configuration space.
+        '''
+        self.workspace = MapEnvironment(json_file=json_file, headless=True, robot_radius=link_radius)
+        self.xlimit, self.ylimit = self.workspace.xlimit, self.workspace.ylimit
+        self.link_lengths = np.asarray(link_lengths, dtype=float)
+        self.base = np.asarray(base if base is not None else self.workspace.start, dtype=float)
+        self.self_collision = self_collision
+        if resolution is None:
+            resolution = 0.01 * max(self.xlimit[1]-self.xlimit[0], self.ylimit[1]-self.ylimit[0])
+        self.resolution = resolution
+
+        # the reach from each joint bounds how far any point of the arm moves per unit of rotation of that joint
+        self.reaches = np.cumsum(self.link_lengths[::-1])[::-1]
+        n = len(self.link_lengths)
+        self.state_space = StateSpace(low=np.full(n, -np.pi), high=np.full(n, np.pi), weights=self.reaches if weights is None else weights,
+                                      angular=np.ones(n, dtype=bool), step_size=step_size)
+
+        self.start = self.state_space.wrap(start)
+        self.goal = self.state_space.wrap(goal)
+        if len(self.start) != n or len(self.goal) != n:
+            raise ValueError('The start and goal must have one angle per link')
+        if not self.state_validity_checker(state=self.start):
+            raise ValueError('Start state must be within the map limits')
+        if not self.state_validity_checker(state=self.goal):
+            raise ValueError('Goal state must be within the map limits')
+
+        # the workspace is only drawn as the background of the arm
+        self.headless = headless if headless is not None else self.workspace.headless
+        self.workspace.headless = self.headless
+        if not self.headless:
+            self.visualize_map()
+
+    def forward_kinematics(self, states):
+        '''
+        Return the positions of the joints and of the end effector for each of the given states.
+        @param states An N x (number of links) array of joint angles.
+        '''
+        angles = np.cumsum(np.asarray(states, dtype=float).reshape(-1, len(self.link_lengths)), axis=1)
+        links = self.link_lengths[:,None] * np.stack([np.cos(angles), np.sin(angles)], axis=2)
+        return np.concatenate([np.broadcast_to(self.base, (len(angles), 1, 2)), self.base + np.cumsum(links, axis=1)], axis=1)
+
+    def get_self_collisions(self, points):
+        '''
+        Return a mask of the poses in which two non-adjacent links cross each other.
+        @param points The N x (number of links + 1) x 2 joint positions of the poses.
+        '''
+        i, j = np.triu_indices(len(self.link_lengths), k=2)
+        if len(i) == 0:
+            return np.zeros(len(points), dtype=bool)
+        p1, p2, q1, q2 = points[:,i], points[:,i+1], points[:,j], points[:,j+1]
+        cross = lambda a, b, c: (b[...,0]-a[...,0]) * (c[...,1]-a[...,1]) - (b[...,1]-a[...,1]) * (c[...,0]-a[...,0])
+        crossing = (cross(p1, p2, q1) * cross(p1, p2, q2) < 0) & (cross(q1, q2, p1) * cross(q1, q2, p2) < 0)
+        return crossing.any(axis=1)
+
+    def compute_distance(self, start_state, end_state):
+        '''
+        Return the distance between two states.
+        @param start_state The starting state (joint angles) of the arm.
+        @param end_state The target state (joint angles) of the arm.
+        '''
+        return float(self.state_space.compute_distances(start_state, end_state))
+
+    def compute_distances(self, states1, states2):
+        '''
+        Return the distances between the given states (broadcast against each other, e.g. all tree vertices against a single state).
+        @param states1 An array of states.
+        @param states2 An array of states.
+        '''
+        return self.state_space.compute_distances(states1, states2)
+
+    def state_validity_checker(self, state):
+        '''
+        Verify that the arm is within the world boundaries and does not intersect an obstacle (or itself).
+        @param state The joint angles of the arm.
+        '''
+        return bool(self.state_validity_checker_batch(np.asarray(state, dtype=float)[None])[0])
+
+    def state_validity_checker_batch(self, states):
+        '''
+        Verify a batch of states at once (vectorized over the states and links).
+        Return a boolean mask which is true for the poses that are in the world boundaries and do not intersect an obstacle.
+        @param states An N x (number of links) array of joint angles.
+        '''
+        points = self.forward_kinematics(states)
+
+        # the links are straight, so the arm is within the (convex) boundaries if all of its joints are
+        valid = np.all((points[...,0] >= self.xlimit[0]) & (points[...,0] <= self.xlimit[1]) &
+                       (points[...,1] >= self.ylimit[0]) & (points[...,1] <= self.ylimit[1]), axis=1)
+        if self.self_collision:
+            valid &= ~self.get_self_collisions(points)
+
+        # verify that no link crosses an obstacle
+        check_idxs = np.nonzero(valid)[0]
+        num_links = len(self.link_lengths)
+        links = np.stack([points[check_idxs,:-1], points[check_idxs,1:]], axis=2).reshape(-1, 2, 2)
+        link_idxs, _ = self.workspace.obstacles_tree.query(shapely.linestrings(links), predicate='intersects')
+        valid[check_idxs[link_idxs // num_links]] = False
+        return valid
+
+    def get_num_edge_points(self, edges):
+        '''
+        Return the number of poses to check along each edge, such that no point of the arm moves more than the resolution between them.
+        @param edges An N x 2 x (number of links) array of edges.
+        '''
+        sweep = np.sum(np.abs(self.state_space.difference(edges[:,0], edges[:,1])) * self.reaches, axis=1)
+        return np.maximum(np.ceil(sweep / self.resolution).astype(np.int64) + 1, 2)
+
+    def edge_validity_checker(self, state1, state2):
+        '''
+        Check if the motion between two states is free from collisions, by checking poses along it at the environment's resolution.
+        @param state1 The source state of the arm.
+        @param state2 The destination state of the arm.
+        '''
+        return bool(self.edge_validity_checker_batch(np.array([[state1, state2]], dtype=float))[0])
+
+    def edge_validity_checker_batch(self, edges):
+        '''
+        Check a batch of edges at once: the poses along all of the edges are checked in a single vectorized call.
+        Return a boolean mask which is true for the edges along which the arm does not collide.
+        @param edges An N x 2 x (number of links) array of edges, each given by its source and destination states.
+        '''
+        edges = np.asarray(edges, dtype=float).reshape(-1, 2, len(self.link_lengths))
+        if len(edges) == 0:
+            return np.zeros(0, dtype=bool)
+        num_points = self.get_num_edge_points(edges)
+        states = np.concatenate([self.state_space.interpolate(e[0], e[1], k) for e, k in zip(edges, num_points)])
+        offsets = np.concatenate([[0], np.cumsum(num_points)[:-1]])
+        return np.logical_and.reduceat(self.state_validity_checker_batch(states), offsets)
+
+    def visualize_map(self, plan=None, tree_edges=None, expanded_nodes=None, output_file=None, max_elements=None):
+        '''
+        Visualize the workspace with the arm at its start and goal poses, and along the plan (if given).
+        The figure is shown, unless an output file is given or the environment is headless.
+        @param plan A given plan (sequence of joint angles) to draw for the arm.
+        @param tree_edges A set of tree edges to draw (as the motions of the end effector).
+        @param expanded_nodes Not drawn (kept for the interface of MapEnvironment).
+        @param output_file If given, save the figure to this file (e.g. 'arm.png') instead of showing it.
+        @param max_elements If given, draw at most this many tree edges and plan poses (evenly decimated).
+        '''
+        workspace = self.workspace
+        plt = workspace.create_map_visualization()
+        fig = plt.gcf()
+        plt = workspace.visualize_obstacles(plt=plt)
+
+        if tree_edges is not None:
+            edges = np.asarray(tree_edges, dtype=float).reshape(-1, 2, len(self.link_lengths))
+            end_effector = self.forward_kinematics(edges.reshape(-1, len(self.link_lengths)))[:,-1].reshape(-1, 2, 2)
+            plt = workspace.visualize_tree_edges(plt=plt, tree_edges=end_effector, color='lightgrey', max_elements=max_elements)
+
+        if plan is not None and len(plan) > 0:
+            poses = workspace.decimate(np.asarray(plan, dtype=float), max_elements)
+            for i, points in enumerate(self.forward_kinematics(poses)):
+                plt.plot(points[:,0], points[:,1], color='navy', alpha=0.2 + 0.6 * i / max(len(poses)-1, 1), linewidth=1, zorder=20)
+            plt = workspace.visualize_plan(plt=plt, plan=self.forward_kinematics(plan)[:,-1], color='navy')
+
+        for state, color in [(self.start, 'r'), (self.goal, 'g')]:
+            points = self.forward_kinematics(state)[0]
+            plt.plot(points[:,0], points[:,1], color=color, linewidth=2, marker='o', markersize=3, zorder=30)
+
+        if output_file is not None:
+            plt.savefig(output_file)
+            plt.close()
+        elif not self.headless:
+            plt.show()
+        else:
+            # a headless figure is never shown, so it is closed rather than accumulating over repeated calls
+            plt.close(fig)
+        return plt
@@ -0,0 +1,100 @@
+# This code was written by Yotam Granov
+
+import numpy as np
+from RRT.SampleSequence import SampleSequence
+
+class BatchSampler(object):
+    def __init__(self, planning_env, goal_prob, seed=None, batch_size=256, sequence='uniform'):
+        '''
+        Draws blocks of goal-biased samples and filters them with a single vectorized validity check.
+        @param planning_env The planning environment.
+        @param goal_prob The probability of sampling the goal state.
+        @param seed Seed (or np.random.Generator) used for all random draws.
+        @param batch_size The number of candidate states drawn per block.
+        @param sequence The sequence the (non-goal, uninformed) states are drawn from, one of SampleSequence.SEQUENCES.
+        '''
+        self.planning_env = planning_env
+        self.goal_prob = goal_prob
+        self.rng = np.random.default_rng(seed)
+        self.batch_size = batch_size
+        self.points = SampleSequence(sequence, dim=len(planning_env.start), seed=self.rng, block_size=batch_size)
+        self.cost_bound = np.inf
+        self.goal = None
+
+    def set_goal(self, goal):
+        '''
+        Set the state drawn by the goal samples (instead of the environment's goal), e.g. for multi-query planning.
+        Batches drawn before the change are not updated.
+        @param goal The goal state.
+        '''
+        self.goal = goal
+
+    def get_goal(self):
+        '''
+        Returns the state drawn by the goal samples.
+        '''
+        return self.goal if self.goal is not None else self.planning_env.goal
+
+    def set_cost_bound(self, cost_bound):
+        '''
+        Set the cost of the best solution found so far. Once it is finite, the non-goal samples are drawn from the informed set,
+        i.e. the ellipse of states whose start-to-goal path length through them is at most the given cost.
+        @param cost_bound The cost of the best solution so far.
+        '''
+        self.cost_bound = cost_bound
+
+    def sample_informed_states(self, n):
+        '''
+        Draw states uniformly from the informed ellipse defined by the start, the goal and the current cost bound.
+        @param n The number of states to draw.
+        '''
+        env = self.planning_env
+        start, goal = np.asarray(env.start, dtype=float), np.asarray(self.get_goal(), dtype=float)
+        c_min = np.linalg.norm(goal - start)
+        r1 = self.cost_bound / 2
+        r2 = np.sqrt(max(self.cost_bound**2 - c_min**2, 0)) / 2
+
+        # uniform samples from the unit disk, scaled to the ellipse, rotated along the start-goal axis and centered between them
+        radius = np.sqrt(self.rng.uniform(size=n))
+        angle = self.rng.uniform(0, 2*np.pi, size=n)
+        x, y = r1 * radius * np.cos(angle), r2 * radius * np.sin(angle)
+        theta = np.arctan2(goal[1]-start[1], goal[0]-start[0])
+        states = np.stack([x*np.cos(theta) - y*np.sin(theta), x*np.sin(theta) + y*np.cos(theta)], axis=1)
+        return states + (start + goal) / 2
+
+    def is_informed(self):
+        '''
+        Check whether the informed set is currently smaller than the map, in which case it is sampled instead of the whole map.
+        '''
+        env = self.planning_env
+        # (the informed set is only sampled for planar states)
+        if not np.isfinite(self.cost_bound) or env.state_space is not None:
+            return False
+        c_min = np.linalg.norm(np.asarray(self.get_goal(), dtype=float) - np.asarray(env.start, dtype=float))
+        ellipse_area = np.pi * (self.cost_bound / 2) * np.sqrt(max(self.cost_bound**2 - c_min**2, 0)) / 2
+        return ellipse_area < (env.xlimit[1]-env.xlimit[0]) * (env.ylimit[1]-env.ylimit[0])
+
+    def sample_batch(self):
+        '''
+        Draw a block of candidate states. Returns the states, a mask of the goal samples and a mask of the valid samples.
+        '''
+        env = self.planning_env
+        is_goal = self.rng.uniform(size=self.batch_size) < self.goal_prob
+        if self.is_informed():
+            states = self.sample_informed_states(self.batch_size)
+        elif env.state_space is not None:
+            states = self.points.draw_in_box(self.batch_size, low=env.state_space.low, high=env.state_space.high)
+        else:
+            states = self.points.draw_in_box(self.batch_size, low=[env.xlimit[0], env.ylimit[0]], high=[env.xlimit[1], env.ylimit[1]])
+        states[is_goal] = self.get_goal()
+        is_valid = env.state_validity_checker_batch(states)
+        return states, is_goal, is_valid
+
+    def iterate(self):
+        '''
+        Generator over the candidate states, yielding (state, is_goal, is_valid) for each of them in order.
+        '''
+        while True:
+            states, is_goal, is_valid = self.sample_batch()
+            for i in range(self.batch_size):
+                yield states[i], bool(is_goal[i]), bool(is_valid[i])
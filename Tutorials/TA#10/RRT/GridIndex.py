@@ -0,0 +1,180 @@
+# This code was written by Yotam Granov
+
+import math
+import heapq
+
+class GridIndex(object):
+    def __init__(self, cell_size, bucket_capacity=8, min_cell_size=1e-3):
+        '''
+        A bucketed uniform grid over the plane, used as an incrementally-updatable spatial index for tree vertices.
+        @param cell_size The initial side length of a grid cell.
+        @param bucket_capacity The average number of points per occupied cell above which the grid is refined.
+        @param min_cell_size The grid will never be refined below this cell size.
+        '''
+        self.cell_size = cell_size
+        self.bucket_capacity = bucket_capacity
+        self.min_cell_size = min_cell_size
+        self.buckets = {}
+        self.points = {}
+        self.cell_bounds = None
+
+    def __len__(self):
+        return len(self.points)
+
+    def get_cell(self, state):
+        '''
+        Return the grid cell containing the given state.
+        @param state The queried state.
+        '''
+        return (int(math.floor(state[0] / self.cell_size)), int(math.floor(state[1] / self.cell_size)))
+
+    def insert(self, pid, state):
+        '''
+        Insert a point into the index.
+        @param pid The ID of the point (e.g. the vertex ID in the tree).
+        @param state The position of the point.
+        '''
+        point = (float(state[0]), float(state[1]))
+        self.points[pid] = point
+        self.insert_to_bucket(pid, point)
+
+        # refine the grid once the buckets become too crowded (amortized O(1), since each refinement quadruples the cells)
+        if len(self.points) > self.bucket_capacity * len(self.buckets) and self.cell_size / 2 >= self.min_cell_size:
+            self.rebuild(self.cell_size / 2)
+
+    def insert_to_bucket(self, pid, point):
+        cell = self.get_cell(point)
+        self.buckets.setdefault(cell, []).append(pid)
+        if self.cell_bounds is None:
+            self.cell_bounds = [cell[0], cell[1], cell[0], cell[1]]
+        else:
+            self.cell_bounds = [min(self.cell_bounds[0], cell[0]), min(self.cell_bounds[1], cell[1]),
+                                max(self.cell_bounds[2], cell[0]), max(self.cell_bounds[3], cell[1])]
+
+    def remove(self, pid):
+        '''
+        Remove a point from the index.
+        @param pid The ID of the point to remove.
+        '''
+        point = self.points.pop(pid)
+        cell = self.get_cell(point)
+        bucket = self.buckets[cell]
+        bucket.remove(pid)
+        if len(bucket) == 0:
+            del self.buckets[cell]
+
+    def rebuild(self, cell_size):
+        '''
+        Re-bucket all points using a new cell size.
+        @param cell_size The new side length of a grid cell.
+        '''
+        self.cell_size = cell_size
+        self.buckets = {}
+        self.cell_bounds = None
+        for pid, point in self.points.items():
+            self.insert_to_bucket(pid, point)
+
+    def get_ring_cells(self, center, r):
+        '''
+        Return the cells whose Chebyshev distance from the center cell is exactly r.
+        @param center The center cell.
+        @param r The ring radius (in cells).
+        '''
+        cx, cy = center
+        if r == 0:
+            return [center]
+        cells = [(cx+dx, cy+dy) for dx in range(-r, r+1) for dy in (-r, r)]
+        cells += [(cx+dx, cy+dy) for dx in (-r, r) for dy in range(-r+1, r)]
+        return cells
+
+    def get_max_ring(self, center):
+        '''
+        Return the ring radius after which no occupied cell is left to visit.
+        @param center The center cell.
+        '''
+        if self.cell_bounds is None:
+            return -1
+        min_cx, min_cy, max_cx, max_cy = self.cell_bounds
+        return max(abs(center[0]-min_cx), abs(center[0]-max_cx), abs(center[1]-min_cy), abs(center[1]-max_cy))
+
+    def get_k_nearest(self, state, k):
+        '''
+        Return the IDs and distances of the k points nearest to the given state, sorted by distance.
+        @param state The queried state.
+        @param k Number of nearest points to retrieve.
+        '''
+        if k <= 0:
+            return [], []
+        qx, qy = float(state[0]), float(state[1])
+        center = self.get_cell((qx, qy))
+        max_ring = self.get_max_ring(center)
+
+        # max-heap (negated distances) of the best k points found so far
+        best = []
+        def visit(cell):
+            for pid in self.buckets.get(cell, ()):
+                px, py = self.points[pid]
+                dist = math.hypot(px-qx, py-qy)
+                if len(best) < k:
+                    heapq.heappush(best, (-dist, pid))
+                elif dist < -best[0][0]:
+                    heapq.heapreplace(best, (-dist, pid))
+
+        r = 0
+        while r <= max_ring:
+            # for queries far away from a sparse set of buckets, visit the occupied buckets ordered by ring instead
+            if (2*r+1)**2 > 4 * len(self.buckets):
+                rings = sorted((max(abs(c[0]-center[0]), abs(c[1]-center[1])), c) for c in self.buckets)
+                for ring, cell in rings:
+                    if ring < r:
+                        continue
+                    if len(best) == k and -best[0][0] <= (ring-1) * self.cell_size:
+                        break
+                    visit(cell)
+                break
+
+            for cell in self.get_ring_cells(center, r):
+                visit(cell)
+
+            # any point outside the visited rings is at least r cells away from the query
+            if len(best) == k and -best[0][0] <= r * self.cell_size:
+                break
+            r += 1
+
+        best = sorted((-d, pid) for d, pid in best)
+        return [pid for _, pid in best], [d for d, _ in best]
+
+    def get_nearest(self, state):
+        '''
+        Return the ID and distance of the point nearest to the given state.
+        @param state The queried state.
+        '''
+        pids, dists = self.get_k_nearest(state, 1)
+        return pids[0], dists[0]
+
+    def get_within_radius(self, state, radius):
+        '''
+        Return the IDs and distances of all points within the given radius from the state.
+        @param state The queried state.
+        @param radius The search radius.
+        '''
+        qx, qy = float(state[0]), float(state[1])
+        min_cell = self.get_cell((qx-radius, qy-radius))
+        max_cell = self.get_cell((qx+radius, qy+radius))
+
+        # visit either the covered cells or the occupied buckets, whichever are fewer
+        num_cells = (max_cell[0]-min_cell[0]+1) * (max_cell[1]-min_cell[1]+1)
+        if num_cells <= len(self.buckets):
+            cells = [(cx, cy) for cx in range(min_cell[0], max_cell[0]+1) for cy in range(min_cell[1], max_cell[1]+1)]
+        else:
+            cells = [c for c in self.buckets if min_cell[0] <= c[0] <= max_cell[0] and min_cell[1] <= c[1] <= max_cell[1]]
+
+        pids, dists = [], []
+        for cell in cells:
+            for pid in self.buckets.get(cell, ()):
+                px, py = self.points[pid]
+                dist = math.hypot(px-qx, py-qy)
+                if dist <= radius:
+                    pids.append(pid)
+                    dists.append(dist)
+        return pids, dists
@@ -0,0 +1,276 @@
+# This code was written by Yotam Granov
+
+import math
+import numpy as np
+import shapely
+from RRT.RRTPlanner import RRTPlanner
+from RRT.GridIndex import GridIndex
+import time
+
+class IncrementalRRTPlanner(RRTPlanner):
+    def __init__(self, planning_env, ext_mode, goal_prob, use_spatial_index=True, tree_backend='dict', seed=None, batch_size=256):
+        '''
+        RRT with incremental replanning: when an obstacle is added to the map, only the tree edges it invalidates are cut.
+        The subtrees hanging from them are kept aside as orphans, and are grafted back onto the tree (re-rooted at the vertex they
+        are reconnected through) whenever it grows next to them, so the cost of replanning scales with the size of the change.
+        @param planning_env The planning environment (obstacles are added through replan, which calls its add_obstacle).
+        @param ext_mode 'E1' to extend all the way to the sample, or 'E2' to extend by a single step.
+        @param goal_prob The probability of sampling the goal.
+        @param use_spatial_index If True, use a grid index for nearest-neighbor and box queries.
+        @param tree_backend The tree implementation, either 'dict' (RRTTree) or 'array' (RRTArrayTree).
+        @param seed Seed (or np.random.Generator) used for all random draws.
+        @param batch_size The number of samples drawn and validity-checked together.
+        '''
+        # obstacles are planar polygons, and the orphans are indexed (and invalidated) by their planar bounding boxes
+        if planning_env.state_space is not None:
+            raise ValueError('Incremental replanning only supports planar maps, not N-dimensional state spaces')
+        super().__init__(planning_env, ext_mode, goal_prob, use_spatial_index=use_spatial_index, tree_backend=tree_backend,
+                         seed=seed, batch_size=batch_size)
+        self.clear_orphans()
+
+    def clear_orphans(self):
+        '''
+        Drop all orphaned vertices.
+        '''
+        extent = max(self.planning_env.xlimit[1]-self.planning_env.xlimit[0], self.planning_env.ylimit[1]-self.planning_env.ylimit[0], 1)
+        self.orphan_index = GridIndex(cell_size=extent/16, min_cell_size=extent/4096)
+        self.orphan_states = {}
+        self.orphan_neighbors = {}
+        self.orphan_max_edge_length = 0
+        self.next_orphan_id = 0
+
+    def replan(self, obstacle, max_iter=None):
+        '''
+        Add an obstacle to the map and repair the tree of the last run around it, and return the new plan.
+        @param obstacle A list of the obstacle's points.
+        @param max_iter If given, grow the tree for at most this number of iterations (and return an empty plan if the goal was not reached).
+        '''
+        start_time = time.time()
+        env = self.planning_env
+
+        # the start and goal are checked before the obstacle is added, so that the map (and the tree) are left unchanged if either is covered
+        geometry = shapely.Polygon(obstacle)
+        if env.robot_radius > 0:
+            geometry = env.inflate_obstacles([geometry])[0]
+        start_covered, goal_covered = shapely.intersects(geometry, shapely.points([self.tree.get_state(self.tree.get_root_id()), env.goal]))
+        if start_covered:
+            raise ValueError('The new obstacle covers the start state')
+        if goal_covered:
+            raise ValueError('The new obstacle covers the goal state')
+        env.add_obstacle(obstacle)
+
+        # the orphans left over from earlier replans (and the edges between them) may be invalidated by the new obstacle as well
+        num_invalid_orphans = self.invalidate_orphans(env.obstacles_bounds[-1])
+
+        # only the edges whose bounding boxes overlap the new obstacle's bounding box are collision-checked again
+        box_vids = self.tree.get_edges_in_box(env.obstacles_bounds[-1])
+        edges = np.array([[self.tree.get_state(self.tree.get_parent(vid)), self.tree.get_state(vid)] for vid in box_vids], dtype=float)
+        invalid_vids = [vid for vid, valid in zip(box_vids, env.edge_validity_checker_batch(edges.reshape(-1, 2, 2))) if not valid]
+        num_orphaned = self.orphan_subtrees(invalid_vids)
+
+        # reconnect the orphans next to the remaining tree first, and only then grow the tree towards the rest of them
+        num_reconnected = 0
+        for oid in list(self.orphan_states):
+            if oid in self.orphan_states:
+                num_reconnected += self.reconnect_orphans(oid=oid)
+        self.goal_idx = self.tree.get_idx_for_state(env.goal)
+        num_iter = 0
+        if self.goal_idx is None:
+            num_iter, num_grown = self.regrow_tree(max_iter)
+            num_reconnected += num_grown
+
+        total_time = time.time()-start_time
+        total_cost = self.tree.get_cost(self.goal_idx) if self.goal_idx is not None else np.inf
+        self.stats = {'num_iter': num_iter, 'cost': float(total_cost), 'time': total_time, 'num_vertices': self.tree.get_num_vertices(),
+                      'num_invalidated': len(invalid_vids), 'num_orphaned': num_orphaned, 'num_reconnected': num_reconnected,
+                      'num_orphans': len(self.orphan_states), 'num_invalid_orphans': num_invalid_orphans}
+
+        print(f"Invalidated edges: {len(invalid_vids)}, orphaned vertices: {num_orphaned}, reconnected vertices: {num_reconnected}")
+        print(f"Total number of iterations needed to reach goal: {num_iter}")
+        print('Total cost of path: {:.3f}'.format(total_cost))
+        print('Total time: {:.3f} seconds'.format(total_time))
+        return self.get_plan()
+
+    def orphan_subtrees(self, vids):
+        '''
+        Cut the edges from the given vertices to their parents, and move the subtrees below them from the tree to the orphans
+        (as an undirected forest, so they can later be re-rooted at any of their vertices). Returns the number of orphaned vertices.
+        @param vids The IDs of the vertices whose edges were invalidated.
+        '''
+        env = self.planning_env
+        cut = set(vids)
+        orphan_ids, edges = {}, []
+        for vid in vids:
+            stack = [vid]
+            while stack:
+                u = stack.pop()
+                orphan_ids[u] = self.add_orphan(self.tree.get_state(u))
+                for child in self.tree.get_children(u):
+                    # edges below an invalid edge may be invalid as well, in which case their subtrees become separate orphans
+                    if child not in cut:
+                        stack.append(child)
+                        edges.append((u, child))
+        for u, child in edges:
+            self.orphan_neighbors[orphan_ids[u]].append(orphan_ids[child])
+            self.orphan_neighbors[orphan_ids[child]].append(orphan_ids[u])
+            self.orphan_max_edge_length = max(self.orphan_max_edge_length, env.compute_distance(self.tree.get_state(u), self.tree.get_state(child)))
+        for vid in vids:
+            if self.tree.has_vertex(vid):
+                self.tree.remove_subtree(vid)
+
+        # vertices covered by the new obstacle cannot be reconnected (all of their edges were cut, since they intersect it too)
+        oids = list(orphan_ids.values())
+        valid = env.state_validity_checker_batch(np.array([self.orphan_states[oid] for oid in oids], dtype=float).reshape(-1, 2))
+        for oid, is_valid in zip(oids, valid):
+            if not is_valid:
+                self.remove_orphan(oid)
+        return len(orphan_ids)
+
+    def invalidate_orphans(self, bounds):
+        '''
+        Check the orphans around a new obstacle against the map: the orphans it covers are removed, and the orphan edges crossing
+        it are cut. Returns the number of removed orphans and cut edges.
+        Both endpoints of an edge crossing the obstacle are within the longest orphan edge length of its box, so only the orphans
+        around it are visited.
+        @param bounds The bounding box of the new obstacle, given as (min_x, min_y, max_x, max_y).
+        '''
+        env = self.planning_env
+        min_x, min_y, max_x, max_y = bounds
+        center = ((min_x + max_x) / 2, (min_y + max_y) / 2)
+        oids, _ = self.orphan_index.get_within_radius(center, math.hypot(max_x - min_x, max_y - min_y) / 2 + self.orphan_max_edge_length)
+        if len(oids) == 0:
+            return 0
+
+        num_invalid = 0
+        valid = env.state_validity_checker_batch(np.array([self.orphan_states[oid] for oid in oids], dtype=float).reshape(-1, 2))
+        for oid, is_valid in zip(oids, valid):
+            if not is_valid:
+                self.remove_orphan(oid)
+                num_invalid += 1
+
+        # each undirected edge is checked once (from its lower orphan ID, if both of its orphans were visited)
+        visited = set(oids)
+        pairs = []
+        for oid in oids:
+            if oid not in self.orphan_states:
+                continue
+            (x1, y1) = self.orphan_states[oid][:2]
+            for neighbor in self.orphan_neighbors[oid]:
+                if neighbor in visited and neighbor < oid:
+                    continue
+                (x2, y2) = self.orphan_states[neighbor][:2]
+                if min(x1, x2) <= max_x and max(x1, x2) >= min_x and min(y1, y2) <= max_y and max(y1, y2) >= min_y:
+                    pairs.append((oid, neighbor))
+        if len(pairs) == 0:
+            return num_invalid
+        edges = np.array([[self.orphan_states[o], self.orphan_states[n]] for o, n in pairs], dtype=float)
+        for (o, n), is_valid in zip(pairs, env.edge_validity_checker_batch(edges)):
+            if not is_valid:
+                self.orphan_neighbors[o].remove(n)
+                self.orphan_neighbors[n].remove(o)
+                num_invalid += 1
+        return num_invalid
+
+    def add_orphan(self, state):
+        '''
+        Add an orphaned vertex (without neighbors), and return its orphan ID.
+        @param state The state of the vertex.
+        '''
+        oid = self.next_orphan_id
+        self.next_orphan_id += 1
+        self.orphan_states[oid] = np.array(state, dtype=float)
+        self.orphan_neighbors[oid] = []
+        self.orphan_index.insert(oid, state)
+        return oid
+
+    def remove_orphan(self, oid):
+        '''
+        Remove an orphaned vertex, together with its edges.
+        @param oid The orphan ID.
+        '''
+        for neighbor in self.orphan_neighbors.pop(oid):
+            self.orphan_neighbors[neighbor].remove(oid)
+        del self.orphan_states[oid]
+        self.orphan_index.remove(oid)
+
+    def reconnect_orphans(self, vid=None, oid=None):
+        '''
+        Try to connect orphaned subtrees to the tree, either through the given orphan (to a tree vertex within a step of it), or
+        through the orphans within a step of the given (new) tree vertex. Returns the number of vertices grafted back onto the tree.
+        @param vid The ID of the tree vertex.
+        @param oid The orphan ID (only used if no tree vertex is given).
+        '''
+        env = self.planning_env
+        if vid is not None:
+            oids, _ = self.orphan_index.get_within_radius(self.tree.get_state(vid), self.step_size)
+            pairs = [(vid, o) for o in oids]
+        else:
+            vids, _ = self.tree.get_neighbors_within_radius(self.orphan_states[oid], self.step_size)
+            pairs = [(v, oid) for v in vids]
+        if len(pairs) == 0:
+            return 0
+
+        edges = np.array([[self.tree.get_state(v), self.orphan_states[o]] for v, o in pairs], dtype=float)
+        num_grafted = 0
+        for (v, o), valid in zip(pairs, env.edge_validity_checker_batch(edges)):
+            if valid and o in self.orphan_states:
+                num_grafted += self.graft_orphans(v, o)
+        return num_grafted
+
+    def graft_orphans(self, vid, oid):
+        '''
+        Move the orphaned subtree containing the given orphan back onto the tree, re-rooted at that orphan and connected to
+        the given tree vertex. Returns the number of grafted vertices.
+        @param vid The ID of the tree vertex.
+        @param oid The orphan ID.
+        '''
+        env = self.planning_env
+        stack = [(vid, oid)]; num_grafted = 0
+        while stack:
+            parent_idx, o = stack.pop()
+            if o not in self.orphan_states:
+                continue
+            state = self.orphan_states[o]
+            new_idx = self.tree.add_vertex(state)
+            self.tree.add_edge(parent_idx, new_idx, env.compute_distance(self.tree.get_state(parent_idx), state))
+            stack.extend((new_idx, neighbor) for neighbor in self.orphan_neighbors[o])
+            self.remove_orphan(o)
+            num_grafted += 1
+        return num_grafted
+
+    def regrow_tree(self, max_iter):
+        '''
+        Grow the tree (as in the first run) until the goal is reached, grafting the orphans next to each new vertex back onto it.
+        Returns the number of iterations and the number of grafted vertices.
+        @param max_iter If given, the maximal number of iterations.
+        '''
+        env = self.planning_env
+        samples = self.sampler.iterate()
+        num_iter = 0; num_grafted = 0
+        while max_iter is None or num_iter < max_iter:
+            num_iter += 1
+
+            # Samples (goal-biased) are drawn and validity-checked in batches
+            s, goal, is_valid = next(samples)
+            if not is_valid:
+                continue
+            nearest_idx, nearest_state = self.tree.get_nearest_state(s)
+
+            # Partial extensions, if enabled
+            goal_added = goal
+            if self.ext_mode == 'E2':
+                s, goal_added = self.extend(nearest_state, s)
+                if s is None or not env.state_validity_checker(s):
+                    continue
+            if not env.edge_validity_checker(s, nearest_state):
+                continue
+            s_idx = self.tree.add_vertex(s)
+            self.tree.add_edge(nearest_idx, s_idx, env.compute_distance(s, nearest_state))
+
+            # the goal may also be reached through a grafted subtree
+            if len(self.orphan_states) > 0:
+                num_grafted += self.reconnect_orphans(vid=s_idx)
+            self.goal_idx = s_idx if goal_added else self.tree.get_idx_for_state(env.goal)
+            if self.goal_idx is not None:
+                break
+        return num_iter, num_grafted
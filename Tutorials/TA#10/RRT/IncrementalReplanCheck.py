@@ -0,0 +1,80 @@
+# This code was written by Yotam Granov
+
+# Regression check for incremental replanning: adds a series of random square obstacles (half of them on the current plan) to
+# the map, replans after each one, and verifies that the plan, every tree edge, every orphan and every orphan edge are still
+# valid against the final map. Exits with a non-zero status if any of them is not.
+# Run from the TA#10 directory: python -m RRT.IncrementalReplanCheck --map RRT/map1.json --seeds 12 --obstacles 4
+
+import io, sys, argparse, contextlib
+import numpy as np
+from RRT.MapEnvironment import MapEnvironment
+from RRT.IncrementalRRTPlanner import IncrementalRRTPlanner
+
+def count_invalid(planning_env, planner, plan):
+    '''
+    Return the numbers of invalid plan edges, tree edges, orphan states and orphan edges.
+    '''
+    env = planning_env
+    def num_invalid_edges(edges):
+        edges = np.asarray(edges, dtype=float).reshape(-1, 2, 2)
+        return int(np.sum(~env.edge_validity_checker_batch(edges))) if len(edges) > 0 else 0
+    orphan_states = np.array(list(planner.orphan_states.values()), dtype=float).reshape(-1, 2)
+    orphan_edges = [[planner.orphan_states[o], planner.orphan_states[n]] for o in planner.orphan_neighbors for n in planner.orphan_neighbors[o] if o < n]
+    return {'plan': num_invalid_edges([[plan[i], plan[i+1]] for i in range(len(plan)-1)]),
+            'tree_edges': num_invalid_edges(planner.tree.get_edges_as_states()),
+            'orphans': int(np.sum(~env.state_validity_checker_batch(orphan_states))) if len(orphan_states) > 0 else 0,
+            'orphan_edges': num_invalid_edges(orphan_edges)}
+
+def run(map_file, ext_mode, tree_backend, raster_resolution, seed, args):
+    '''
+    Plan, then replan after each of the random obstacles, and return the invalid counts on the final map.
+    '''
+    planning_env = MapEnvironment(json_file=map_file, headless=True, raster_resolution=raster_resolution)
+    planner = IncrementalRRTPlanner(planning_env, ext_mode, args.goal_prob, tree_backend=tree_backend, seed=seed)
+    rng = np.random.default_rng(seed)
+    low = np.array([planning_env.xlimit[0], planning_env.ylimit[0]], dtype=float)
+    high = np.array([planning_env.xlimit[1], planning_env.ylimit[1]], dtype=float)
+    with contextlib.redirect_stdout(io.StringIO()):
+        plan = planner.plan(max_iter=args.max_iter)
+        for _ in range(args.obstacles):
+            center = plan[rng.integers(len(plan))] if len(plan) > 0 and rng.uniform() < 0.5 else rng.uniform(low, high)
+            d = rng.uniform(0.02, 0.1) * np.max(high - low)
+            corners = np.clip(center + d * np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]]), low, high)
+            try:
+                plan = planner.replan(corners.tolist(), max_iter=args.max_iter)
+            except ValueError:
+                # obstacles covering the start or goal are rejected (and leave the map unchanged)
+                continue
+    return count_invalid(planning_env, planner, plan)
+
+def main():
+    parser = argparse.ArgumentParser(description='Regression check of the tree and orphans after a series of incremental replans.')
+    parser.add_argument('--map', default='RRT/map1.json')
+    parser.add_argument('--ext-modes', nargs='+', default=['E1', 'E2'], choices=['E1', 'E2'])
+    parser.add_argument('--tree-backends', nargs='+', default=['dict', 'array'], choices=['dict', 'array'])
+    parser.add_argument('--raster-resolutions', nargs='+', type=float, default=[0, 10], help='0 for exact collision checks')
+    parser.add_argument('--goal-prob', type=float, default=0.05)
+    parser.add_argument('--seeds', type=int, default=12)
+    parser.add_argument('--obstacles', type=int, default=4, help='the number of obstacles added (and replans) per run')
+    parser.add_argument('--max-iter', type=int, default=20000)
+    args = parser.parse_args()
+
+    num_failed = 0
+    print('{:<4} {:<6} {:>7} {:>6} {:>11} {:>8} {:>13}'.format('ext', 'tree', 'raster', 'plan', 'tree edges', 'orphans', 'orphan edges'))
+    for ext_mode in args.ext_modes:
+        for tree_backend in args.tree_backends:
+            for raster_resolution in args.raster_resolutions:
+                totals = {'plan': 0, 'tree_edges': 0, 'orphans': 0, 'orphan_edges': 0}
+                for seed in range(args.seeds):
+                    counts = run(args.map, ext_mode, tree_backend, raster_resolution or None, seed, args)
+                    totals = {key: totals[key] + counts[key] for key in totals}
+                num_failed += sum(totals.values())
+                print('{:<4} {:<6} {:>7g} {:>6} {:>11} {:>8} {:>13}'.format(ext_mode, tree_backend, raster_resolution, totals['plan'],
+                      totals['tree_edges'], totals['orphans'], totals['orphan_edges']))
+    if num_failed > 0:
+        print('Found {} invalid states and edges'.format(num_failed))
+        sys.exit(1)
+    print('All plans, tree edges and orphans are valid')
+
+if __name__ == '__main__':
+    main()
@@ -1,26 +1,54 @@
 # This code was written by Oren Salzman and Dean Zadok, and revised by Yotam Granov
 
-import os, json
+import os, sys, json, math, shutil, hashlib, tempfile
 import numpy as np
-from matplotlib import pyplot as plt
+import shapely
 from shapely.geometry import Point, LineString, Polygon
 
+# set this environment variable (to anything but 0/false) to construct all environments in headless mode
+HEADLESS_ENV_VAR = 'MAP_ENV_HEADLESS'
+
+# compiled maps (of environments created with use_cache) are cached in this directory (by default, a .map_cache directory next to each JSON file)
+CACHE_DIR_ENV_VAR = 'MAP_ENV_CACHE_DIR'
+
+# bump whenever the layout of the compiled maps changes, so that stale caches are ignored
+COMPILED_MAP_VERSION = 1
+
 class MapEnvironment(object):
-    def __init__(self, json_file):
+    def __init__(self, json_file, raster_resolution=None, headless=None, use_cache=False, cache_dir=None, robot_radius=0):
 
         # check if json file exists and load
         json_path = os.path.join(os.getcwd(), json_file)
         if not os.path.isfile(json_path):
             raise ValueError('Json file does not exist!');
-        with open(json_path) as f:
-            json_dict = json.load(f)
+        with open(json_path, 'rb') as f:
+            json_bytes = f.read()
+
+        # optionally rasterize the obstacles (given in grid cells per map unit) for faster collision checks
+        self.raster_resolution = raster_resolution
 
-        # obtain boundary limits, start and inspection points
-        self.xlimit = [0, json_dict['WIDTH']-1]
-        self.ylimit = [0, json_dict['HEIGHT']-1]
-        self.start = np.array(json_dict['START'])
-        self.goal = np.array(json_dict['GOAL'])
-        self.load_obstacles(obstacles=json_dict['OBSTACLES'])
+        # a robot with a circular footprint is checked as a point against the obstacles inflated by its radius
+        # (the map boundaries are not shrunk, the robot's center must stay within them as before)
+        self.robot_radius = robot_radius
+
+        # the states are planar positions under the Euclidean distance (N-dimensional environments set a StateSpace instead)
+        self.state_space = None
+
+        # compiled maps are only cached on request (use_cache), since the cache is written to disk and cached maps skip the
+        # validation of the obstacles. They are keyed by the content hash of the JSON file, so a cached map is fresh whenever it exists
+        self.cache_path = self.get_cache_path(json_path, json_bytes, cache_dir) if use_cache else None
+        if self.cache_path is not None and os.path.isdir(self.cache_path):
+            self.load_compiled_map()
+        else:
+            json_dict = json.loads(json_bytes)
+
+            # obtain boundary limits, start and inspection points
+            self.xlimit = [0, json_dict['WIDTH']-1]
+            self.ylimit = [0, json_dict['HEIGHT']-1]
+            self.start = np.array(json_dict['START'])
+            self.goal = np.array(json_dict['GOAL'])
+            self.load_obstacles(obstacles=json_dict['OBSTACLES'])
+            self.save_compiled_map()
 
         # check that the start location is within limits and collision free
         if not self.state_validity_checker(state=self.start):
@@ -30,8 +58,14 @@ class MapEnvironment(object):
         if not self.state_validity_checker(state=self.goal):
             raise ValueError('Goal state must be within the map limits');
 
+        # in headless mode the map is not displayed, and matplotlib is only imported (with an off-screen backend) if it is drawn
+        if headless is None:
+            headless = os.environ.get(HEADLESS_ENV_VAR, '0').lower() not in ('', '0', 'false')
+        self.headless = headless
+
         # if you want to - you can display starting map here
-        self.visualize_map()
+        if not self.headless:
+            self.visualize_map()
 
     def load_obstacles(self, obstacles):
         '''
@@ -39,17 +73,351 @@ class MapEnvironment(object):
         @param obstacles A list of lists of obstacles points.
         '''
         # iterate over all obstacles
-        self.obstacles, self.obstacles_edges = [], []
+        self.original_obstacles, self.obstacles_edges = [], []
+        self.open_obstacles = []
         for obstacle in obstacles:
             non_applicable_vertices = [x[0] < self.xlimit[0] or x[0] > self.xlimit[1] or x[1] < self.ylimit[0] or x[1] > self.ylimit[1] for x in obstacle]
             if any(non_applicable_vertices):
                 raise ValueError('An obstacle coincides with the maps boundaries!');
             
             # make sure that the obstacle is a closed form
+            self.open_obstacles.append(obstacle[0] != obstacle[-1])
             if obstacle[0] != obstacle[-1]:
                 obstacle.append(obstacle[0])
                 self.obstacles_edges.append([LineString([Point(x[0],x[1]),Point(y[0],y[1])]) for (x,y) in zip(obstacle[:-1], obstacle[1:])])
-            self.obstacles.append(Polygon(obstacle))
+            self.original_obstacles.append(Polygon(obstacle))
+        self.original_obstacles_bounds = shapely.bounds(self.original_obstacles).reshape(-1, 4)
+
+        # index the obstacles' bounding boxes and prepare them for repeated predicate checks
+        self.build_collision_index()
+
+    def build_collision_index(self):
+        '''
+        Build an STRtree over the bounding boxes of the obstacles, and prepare the obstacle geometries.
+        If the robot has a radius, the index (and the raster) are built over the inflated obstacles.
+        '''
+        if self.robot_radius > 0:
+            self.obstacles = self.get_inflated_obstacles()
+            self.obstacles_bounds = shapely.bounds(self.obstacles).reshape(-1, 4)
+        else:
+            self.obstacles = self.original_obstacles
+            self.obstacles_bounds = self.original_obstacles_bounds
+        shapely.prepare(self.obstacles)
+        self.obstacles_tree = shapely.STRtree(self.obstacles)
+        if self.raster_resolution is not None and not self.load_compiled_raster():
+            self.build_raster()
+            self.save_compiled_raster()
+
+    def get_cache_path(self, json_path, json_bytes, cache_dir):
+        '''
+        Return the directory of the compiled map for the given JSON file.
+        @param json_path The path of the JSON file.
+        @param json_bytes The content of the JSON file.
+        @param cache_dir The cache directory (if None, taken from the environment variable or placed next to the JSON file).
+        '''
+        if cache_dir is None:
+            cache_dir = os.environ.get(CACHE_DIR_ENV_VAR, os.path.join(os.path.dirname(json_path), '.map_cache'))
+        content_hash = hashlib.sha1(json_bytes).hexdigest()
+        return os.path.join(cache_dir, 'v{}-{}'.format(COMPILED_MAP_VERSION, content_hash))
+
+    def save_compiled_map(self):
+        '''
+        Save the map as a compiled map: the limits, start and goal in a small JSON file, and the obstacle vertices
+        (concatenated, with per-obstacle offsets) and bounding boxes as .npy arrays. The directory is written atomically,
+        so concurrent workers never load a partially written map.
+        '''
+        if self.cache_path is None:
+            return
+        coords = [np.asarray(obstacle.exterior.coords) for obstacle in self.original_obstacles]
+        arrays = {
+            'vertices': np.concatenate(coords) if coords else np.zeros((0, 2)),
+            'offsets': np.cumsum([0] + [len(c) for c in coords]).astype(np.int64),
+            'bounds': np.asarray(self.original_obstacles_bounds),
+            'open_obstacles': np.array(self.open_obstacles, dtype=bool),
+        }
+        meta = {'xlimit': self.xlimit, 'ylimit': self.ylimit, 'start': self.start.tolist(), 'goal': self.goal.tolist()}
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = tempfile.mkdtemp(dir=os.path.dirname(self.cache_path))
+            with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_path, name + '.npy'), array)
+            os.rename(tmp_path, self.cache_path)
+        except OSError:
+            # the cache is an optimization only (e.g. the directory is read-only, or another worker wrote it first)
+            if tmp_path is not None:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def load_compiled_map(self):
+        '''
+        Load a compiled map, memory-mapping its arrays, and rebuild the obstacle geometries from them in a single vectorized call.
+        '''
+        with open(os.path.join(self.cache_path, 'meta.json')) as f:
+            meta = json.load(f)
+        self.xlimit, self.ylimit = meta['xlimit'], meta['ylimit']
+        self.start, self.goal = np.array(meta['start']), np.array(meta['goal'])
+
+        vertices = np.load(os.path.join(self.cache_path, 'vertices.npy'), mmap_mode='r')
+        offsets = np.load(os.path.join(self.cache_path, 'offsets.npy'))
+        self.original_obstacles_bounds = np.load(os.path.join(self.cache_path, 'bounds.npy'), mmap_mode='r')
+        self.open_obstacles = np.load(os.path.join(self.cache_path, 'open_obstacles.npy')).tolist()
+
+        ring_ids = np.repeat(np.arange(len(offsets)-1), np.diff(offsets))
+        rings = shapely.linearrings(vertices, indices=ring_ids) if len(vertices) > 0 else []
+        self.original_obstacles = list(shapely.polygons(rings))
+        self.obstacles_edges = [list(shapely.linestrings(np.stack([vertices[i:j-1], vertices[i+1:j]], axis=1)))
+                                for i, j, is_open in zip(offsets[:-1], offsets[1:], self.open_obstacles) if is_open]
+        self.build_collision_index()
+
+    def get_inflated_obstacles(self):
+        '''
+        Return the obstacles inflated by the robot radius, loading them from the compiled map if cached.
+        '''
+        prefix = os.path.join(self.cache_path, 'inflated_{}_'.format(self.robot_radius)) if self.cache_path is not None else None
+        files = [prefix + name + '.npy' for name in ('coords', 'ring_offsets', 'polygon_offsets')] if prefix is not None else []
+        if prefix is not None and all(os.path.isfile(path) for path in files):
+            coords, ring_offsets, polygon_offsets = [np.load(path) for path in files]
+            return list(shapely.from_ragged_array(shapely.GeometryType.POLYGON, coords, (ring_offsets, polygon_offsets)))
+
+        inflated = self.inflate_obstacles(self.original_obstacles)
+        if prefix is not None and os.path.isdir(self.cache_path) and all(shapely.get_type_id(inflated) == shapely.GeometryType.POLYGON):
+            _, coords, (ring_offsets, polygon_offsets) = shapely.to_ragged_array(inflated)
+            try:
+                for path, array in zip(files, [coords, ring_offsets, polygon_offsets]):
+                    tmp_path = path + '.{}.tmp.npy'.format(os.getpid())
+                    np.save(tmp_path, array)
+                    os.replace(tmp_path, path)
+            except OSError:
+                pass
+        return list(inflated)
+
+    def inflate_obstacles(self, obstacles):
+        '''
+        Return the given obstacles inflated by the robot radius (their Minkowski sums with a disk).
+        The buffer approximates the disk by a polygon, so the distance is enlarged to make that polygon circumscribe the disk.
+        @param obstacles A list of obstacle polygons.
+        '''
+        quad_segs = 8
+        return shapely.buffer(obstacles, self.robot_radius / np.cos(np.pi / (4 * quad_segs)), quad_segs=quad_segs)
+
+    def add_obstacle(self, obstacle):
+        '''
+        Add an obstacle to the map, updating the collision index and the raster (only around the new obstacle) in place.
+        Returns the geometry the robot is checked against (the obstacle inflated by the robot radius, if any).
+        @param obstacle A list of the obstacle's points.
+        '''
+        obstacle = [list(x) for x in obstacle]
+        if any(x[0] < self.xlimit[0] or x[0] > self.xlimit[1] or x[1] < self.ylimit[0] or x[1] > self.ylimit[1] for x in obstacle):
+            raise ValueError('An obstacle coincides with the maps boundaries!');
+
+        # make sure that the obstacle is a closed form
+        self.open_obstacles.append(obstacle[0] != obstacle[-1])
+        if obstacle[0] != obstacle[-1]:
+            obstacle.append(obstacle[0])
+            self.obstacles_edges.append([LineString([Point(x[0],x[1]),Point(y[0],y[1])]) for (x,y) in zip(obstacle[:-1], obstacle[1:])])
+        polygon = Polygon(obstacle)
+        self.original_obstacles = list(self.original_obstacles) + [polygon]
+        self.original_obstacles_bounds = np.concatenate([self.original_obstacles_bounds, shapely.bounds(polygon).reshape(1, 4)])
+
+        if self.robot_radius > 0:
+            geometry = self.inflate_obstacles([polygon])[0]
+            self.obstacles = list(self.obstacles) + [geometry]
+            self.obstacles_bounds = np.concatenate([self.obstacles_bounds, shapely.bounds(geometry).reshape(1, 4)])
+        else:
+            geometry = polygon
+            self.obstacles = self.original_obstacles
+            self.obstacles_bounds = self.original_obstacles_bounds
+
+        # STRtrees are immutable, but rebuilding one over the (already prepared) obstacles is cheap next to re-parsing the map
+        shapely.prepare(geometry)
+        self.obstacles_tree = shapely.STRtree(self.obstacles)
+        if self.raster_resolution is not None:
+            self.add_to_raster(geometry, self.obstacles_bounds[-1])
+
+        # the map no longer matches its compiled map, which must be neither read nor overwritten from now on
+        self.cache_path = None
+        return geometry
+
+    def add_to_raster(self, obstacle, bounds):
+        '''
+        Mark the raster cells touched by a new obstacle as occupied, and lower the clearance bounds of all cells by their distances
+        to the obstacle's bounding box (a lower bound on the distance to the obstacle itself), instead of recomputing the distance transform.
+        @param obstacle The new obstacle.
+        @param bounds The bounding box of the obstacle, given as (min_x, min_y, max_x, max_y).
+        '''
+        # a memory-mapped (cached) raster is read-only, so it is copied on the first change
+        if not self.raster_occupancy.flags.writeable:
+            self.raster_occupancy = np.array(self.raster_occupancy)
+            self.raster_clearance = np.array(self.raster_clearance)
+
+        # only test the cells within the obstacle's bounding box, unpacking the bytes that hold them
+        min_x, min_y, max_x, max_y = bounds
+        (ix0, iy0), (ix1, iy1) = self.get_raster_cells(np.array([[min_x, min_y], [max_x, max_y]]))
+        xs, ys = np.meshgrid(np.arange(ix0, ix1+1), np.arange(iy0, iy1+1))
+        cells = shapely.box(self.xlimit[0] + xs*self.raster_cell_size, self.ylimit[0] + ys*self.raster_cell_size,
+                            self.xlimit[0] + (xs+1)*self.raster_cell_size, self.ylimit[0] + (ys+1)*self.raster_cell_size)
+        byte0, byte1 = ix0 >> 3, (ix1 >> 3) + 1
+        occupancy = np.unpackbits(self.raster_occupancy[iy0:iy1+1, byte0:byte1], axis=1)
+        occupancy[:, ix0-8*byte0:ix1-8*byte0+1] |= shapely.intersects(obstacle, cells).astype(np.uint8)
+        self.raster_occupancy[iy0:iy1+1, byte0:byte1] = np.packbits(occupancy, axis=1)
+
+        # the distance between each cell and the bounding box (zero for the cells overlapping it)
+        cell_x = self.xlimit[0] + np.arange(self.raster_shape[1]) * self.raster_cell_size
+        cell_y = self.ylimit[0] + np.arange(self.raster_shape[0]) * self.raster_cell_size
+        dx = np.maximum(np.maximum(min_x - (cell_x + self.raster_cell_size), cell_x - max_x), 0)
+        dy = np.maximum(np.maximum(min_y - (cell_y + self.raster_cell_size), cell_y - max_y), 0)
+        np.minimum(self.raster_clearance, np.hypot(dy[:,None], dx[None,:]).astype(np.float32), out=self.raster_clearance)
+
+    def get_raster_cache_files(self):
+        '''
+        Return the paths of the compiled raster arrays for the current raster resolution.
+        '''
+        prefix = os.path.join(self.cache_path, 'raster_{}_'.format(self.raster_resolution))
+        if self.robot_radius > 0:
+            prefix += 'radius_{}_'.format(self.robot_radius)
+        return prefix + 'occupancy.npy', prefix + 'clearance.npy'
+
+    def save_compiled_raster(self):
+        '''
+        Add the raster arrays to the compiled map (if it exists).
+        '''
+        if self.cache_path is None or not os.path.isdir(self.cache_path):
+            return
+        for path, array in zip(self.get_raster_cache_files(), [self.raster_occupancy, self.raster_clearance]):
+            try:
+                # write to a temporary file first, so that readers never see a partially written array
+                tmp_path = path + '.{}.tmp.npy'.format(os.getpid())
+                np.save(tmp_path, array)
+                os.replace(tmp_path, path)
+            except OSError:
+                return
+
+    def load_compiled_raster(self):
+        '''
+        Memory-map the raster arrays from the compiled map. Returns False if they are not cached.
+        '''
+        if self.cache_path is None:
+            return False
+        occupancy_path, clearance_path = self.get_raster_cache_files()
+        if not (os.path.isfile(occupancy_path) and os.path.isfile(clearance_path)):
+            return False
+        self.raster_cell_size = 1.0 / self.raster_resolution
+        self.raster_occupancy = np.load(occupancy_path, mmap_mode='r')
+        self.raster_clearance = np.load(clearance_path, mmap_mode='r')
+        self.raster_shape = self.raster_clearance.shape
+        return True
+
+    def __getstate__(self):
+        # the prepared geometries and the STRtree are rebuilt when unpickling (e.g. when sent to worker processes)
+        state = self.__dict__.copy()
+        del state['obstacles_tree']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        shapely.prepare(self.obstacles)
+        self.obstacles_tree = shapely.STRtree(self.obstacles)
+
+    def build_raster(self):
+        '''
+        Rasterize the obstacles into a bit-packed occupancy grid, where a cell is occupied if any obstacle touches it,
+        and compute a Euclidean distance transform over the free cells. The distance transform is stored as a
+        lower bound on the clearance (distance to the nearest obstacle) of any point in each cell.
+        '''
+        from scipy.ndimage import distance_transform_edt
+
+        self.raster_cell_size = 1.0 / self.raster_resolution
+        nx = max(1, int(np.ceil((self.xlimit[1]-self.xlimit[0]) * self.raster_resolution)))
+        ny = max(1, int(np.ceil((self.ylimit[1]-self.ylimit[0]) * self.raster_resolution)))
+        occupancy = np.zeros((ny, nx), dtype=bool)
+        self.raster_shape = occupancy.shape
+
+        # only test the cells within each obstacle's bounding box
+        for obstacle, (min_x, min_y, max_x, max_y) in zip(self.obstacles, self.obstacles_bounds):
+            (ix0, iy0), (ix1, iy1) = self.get_raster_cells(np.array([[min_x, min_y], [max_x, max_y]]))
+            xs, ys = np.meshgrid(np.arange(ix0, ix1+1), np.arange(iy0, iy1+1))
+            cells = shapely.box(self.xlimit[0] + xs*self.raster_cell_size, self.ylimit[0] + ys*self.raster_cell_size,
+                                self.xlimit[0] + (xs+1)*self.raster_cell_size, self.ylimit[0] + (ys+1)*self.raster_cell_size)
+            occupancy[iy0:iy1+1, ix0:ix1+1] |= shapely.intersects(obstacle, cells)
+        self.raster_occupancy = np.packbits(occupancy, axis=1)
+
+        # a point in a free cell is at least (edt - sqrt(2)) cells away from any point in an occupied cell
+        if occupancy.any():
+            edt = distance_transform_edt(~occupancy)
+            self.raster_clearance = (np.maximum(edt - np.sqrt(2), 0) * self.raster_cell_size).astype(np.float32)
+        else:
+            self.raster_clearance = np.full(occupancy.shape, np.inf, dtype=np.float32)
+
+    def get_raster_cells(self, states):
+        '''
+        Return the raster cell (column, row) containing each of the given states.
+        @param states An Nx2 array of positions (assumed to be within the world boundaries).
+        '''
+        cells = np.floor((states - [self.xlimit[0], self.ylimit[0]]) / self.raster_cell_size).astype(np.int64)
+        return np.minimum(np.maximum(cells, 0), [self.raster_shape[1]-1, self.raster_shape[0]-1])
+
+    def get_raster_cell(self, x, y):
+        '''
+        Return the raster cell (column, row) containing a single state, given by its coordinates.
+        @param x The x coordinate of the state (assumed to be within the world boundaries).
+        @param y The y coordinate of the state (assumed to be within the world boundaries).
+        '''
+        ix = min(max(int(math.floor((x - self.xlimit[0]) / self.raster_cell_size)), 0), self.raster_shape[1]-1)
+        iy = min(max(int(math.floor((y - self.ylimit[0]) / self.raster_cell_size)), 0), self.raster_shape[0]-1)
+        return ix, iy
+
+    def is_raster_occupied(self, cells):
+        '''
+        Look up the bit-packed occupancy grid for each of the given cells.
+        @param cells An Nx2 array of raster cells (column, row).
+        '''
+        packed = self.raster_occupancy[cells[:,1], cells[:,0] >> 3]
+        return ((packed >> (7 - (cells[:,0] & 7))) & 1).astype(bool)
+
+    def get_clearance_bound(self, states):
+        '''
+        Return a lower bound on the distance from each of the given states to the nearest obstacle, using the raster.
+        States outside the world boundaries get a bound of zero.
+        @param states An Nx2 array of positions.
+        '''
+        in_bounds = (states[:,0] >= self.xlimit[0]) & (states[:,1] >= self.ylimit[0]) & (states[:,0] <= self.xlimit[1]) & (states[:,1] <= self.ylimit[1])
+        cells = self.get_raster_cells(states)
+        return np.where(in_bounds, self.raster_clearance[cells[:,1], cells[:,0]], 0)
+
+    def get_clearance_bound_xy(self, x, y):
+        '''
+        Return a lower bound on the distance from a single state to the nearest obstacle, using the raster.
+        @param x The x coordinate of the state.
+        @param y The y coordinate of the state.
+        '''
+        if x < self.xlimit[0] or y < self.ylimit[0] or x > self.xlimit[1] or y > self.ylimit[1]:
+            return 0
+        ix, iy = self.get_raster_cell(x, y)
+        return self.raster_clearance[iy, ix]
+
+    def raster_edge_is_free(self, state1, state2):
+        '''
+        Try to certify that the edge between two states is collision free by stepping along it, where each step
+        advances by the clearance bound of the current point. Return False if the edge comes near an obstacle, in
+        which case the result is undecided and an exact check is needed.
+        @param state1 The source state of the robot.
+        @param state2 The destination state of the robot.
+        '''
+        x1, y1 = float(state1[0]), float(state1[1])
+        dx, dy = float(state2[0]) - x1, float(state2[1]) - y1
+        length = math.hypot(dx, dy)
+        t = 0
+        while True:
+            clearance = self.get_clearance_bound_xy(x1 + t * dx, y1 + t * dy)
+            if clearance < self.raster_cell_size:
+                return False
+            if length == 0:
+                return True
+            t += clearance / length
+            if t >= 1:
+                return True
 
     def compute_distance(self, start_state, end_state):
         '''
@@ -59,6 +427,21 @@ class MapEnvironment(object):
         '''
         return np.linalg.norm(np.array(end_state) - np.array(start_state))
 
+    def compute_distances(self, states1, states2):
+        '''
+        Return the Euclidean distances between the given states (broadcast against each other, e.g. all tree vertices against a single state).
+        @param states1 An array of positions.
+        @param states2 An array of positions.
+        '''
+        return np.linalg.norm(np.asarray(states2, dtype=float) - np.asarray(states1, dtype=float), axis=-1)
+
+    def get_free_space_area(self):
+        '''
+        Return the area of the free space, i.e. the map area which is not covered by obstacles.
+        '''
+        map_area = (self.xlimit[1]-self.xlimit[0]) * (self.ylimit[1]-self.ylimit[0])
+        return map_area - shapely.union_all(self.obstacles).area
+
     def state_validity_checker(self, state):
         '''
         Verify that the state is in the world boundaries, and is not inside an obstacle.
@@ -73,39 +456,91 @@ class MapEnvironment(object):
         if state[0] < self.xlimit[0] or state[1] < self.ylimit[0] or state[0] > self.xlimit[1] or state[1] > self.ylimit[1]:
             return False
 
+        # points in raster cells that no obstacle touches are free, otherwise fall back to an exact check
+        if self.raster_resolution is not None:
+            ix, iy = self.get_raster_cell(state[0], state[1])
+            if not (self.raster_occupancy[iy, ix >> 3] >> (7 - (ix & 7))) & 1:
+                return True
+
         # verify that the robot is not positioned inside an obstacle
-        for obstacle in self.obstacles:
-            if obstacle.intersects(Point(state[0], state[1])):
-                return False
+        if len(self.obstacles_tree.query(Point(state[0], state[1]), predicate='intersects')) > 0:
+            return False
 
         return True
 
+    def state_validity_checker_batch(self, states):
+        '''
+        Verify a batch of states at once (vectorized over the states).
+        Return a boolean mask which is true for the states that are in the world boundaries and not inside an obstacle.
+        @param states An Nx2 array of positions of the robot.
+        '''
+        states = np.asarray(states, dtype=float).reshape(-1, 2)
+
+        # verify that the robot positions are between world boundaries
+        valid = (states[:,0] >= self.xlimit[0]) & (states[:,1] >= self.ylimit[0]) & (states[:,0] <= self.xlimit[1]) & (states[:,1] <= self.ylimit[1])
+
+        # only the points in occupied raster cells need an exact check
+        check_idxs = np.nonzero(valid)[0]
+        if self.raster_resolution is not None:
+            check_idxs = check_idxs[self.is_raster_occupied(self.get_raster_cells(states[check_idxs]))]
+
+        # verify that the robot is not positioned inside an obstacle
+        point_idxs, _ = self.obstacles_tree.query(shapely.points(states[check_idxs]), predicate='intersects')
+        valid[check_idxs[point_idxs]] = False
+        return valid
+
     def edge_validity_checker(self, state1, state2):
         '''
         A function to check if the edge between two states is free from collisions. The function will return False if the edge intersects another obstacle.
         @param state1 The source state of the robot.
         @param state2 The destination state of the robot.
         '''
+        # edges that stay clear of the obstacles according to the raster are free, otherwise fall back to an exact check
+        if self.raster_resolution is not None and self.raster_edge_is_free(state1, state2):
+            return True
+
         # define undirected edge
         given_edge = LineString([state1, state2])
 
         # verify that the robot does not crossing any obstacle
-        for obstacle in self.obstacles:
-            if given_edge.intersects(obstacle):
-                return False
+        if len(self.obstacles_tree.query(given_edge, predicate='intersects')) > 0:
+            return False
 
         return True
 
-    def visualize_map(self, plan=None, tree_edges=None, expanded_nodes=None):
+    def edge_validity_checker_batch(self, edges):
+        '''
+        Check a batch of edges at once (vectorized over the edges).
+        Return a boolean mask which is true for the edges that do not intersect any obstacle.
+        @param edges An Nx2x2 array of edges, each given by its source and destination states.
+        '''
+        edges = np.asarray(edges, dtype=float).reshape(-1, 2, 2)
+        valid = np.ones(len(edges), dtype=bool)
+
+        # edges contained in the clearance ball around their midpoint are free, the rest need an exact check
+        check_idxs = np.arange(len(edges))
+        if self.raster_resolution is not None:
+            half_lengths = np.linalg.norm(edges[:,1] - edges[:,0], axis=1) / 2
+            check_idxs = np.nonzero(self.get_clearance_bound(edges.mean(axis=1)) <= half_lengths)[0]
+
+        # verify that the robot does not crossing any obstacle
+        edge_idxs, _ = self.obstacles_tree.query(shapely.linestrings(edges[check_idxs]), predicate='intersects')
+        valid[check_idxs[edge_idxs]] = False
+        return valid
+
+    def visualize_map(self, plan=None, tree_edges=None, expanded_nodes=None, output_file=None, max_elements=None):
         '''
         Visualize map with current state of robot and obstacles in the map.
-        @param show_map If to show the map or save it.
+        The figure is shown, unless an output file is given or the environment is headless.
         @param plan A given plan to draw for the robot.
         @param tree_edges A set of tree edges to draw.
         @param expanded_nodes A set of expanded nodes to draw.
+        @param output_file If given, save the figure to this file (e.g. 'map.png') instead of showing it.
+        @param max_elements If given, draw at most this many tree edges and expanded nodes (evenly decimated).
         '''
         # create empty background
         plt = self.create_map_visualization()
+        fig = plt.gcf()
 
         # add obstacles
         plt = self.visualize_obstacles(plt=plt)
@@ -116,11 +551,11 @@ class MapEnvironment(object):
 
         # add tree edges if given
         if tree_edges is not None:
-            plt = self.visualize_tree_edges(plt=plt, tree_edges=tree_edges, color='lightgrey')
+            plt = self.visualize_tree_edges(plt=plt, tree_edges=tree_edges, color='lightgrey', max_elements=max_elements)
 
         # add expanded nodes if given
         if expanded_nodes is not None:
-            plt = self.visualize_expanded_nodes(plt=plt, expanded_nodes=expanded_nodes, color='lightgrey')
+            plt = self.visualize_expanded_nodes(plt=plt, expanded_nodes=expanded_nodes, color='lightgrey', max_elements=max_elements)
 
         # add start
         plt = self.visualize_point_location(plt=plt, state=self.start, color='r')
@@ -128,7 +563,25 @@ class MapEnvironment(object):
         # add goal or inspection points
         plt = self.visualize_point_location(plt=plt, state=self.goal, color='g')
 
-        plt.show()
+        if output_file is not None:
+            plt.savefig(output_file)
+            plt.close()
+        elif not self.headless:
+            plt.show()
+        else:
+            # a headless figure is never shown, so it is closed rather than accumulating over repeated calls
+            plt.close(fig)
+        return plt
+
+    def import_pyplot(self):
+        '''
+        Import matplotlib's pyplot on first use. In headless mode, the off-screen Agg backend is selected only if pyplot was not
+        imported yet, so that the backend of a caller which already set pyplot up is never switched.
+        '''
+        if self.headless and 'matplotlib.pyplot' not in sys.modules:
+            import matplotlib
+            matplotlib.use('Agg')
+        from matplotlib import pyplot as plt
         return plt
 
     def create_map_visualization(self):
@@ -136,6 +589,7 @@ class MapEnvironment(object):
         Prepare the plot of the scene for visualization.
         '''
         # create figure and add background
+        plt = self.import_pyplot()
         plt.figure()
         back_img = np.zeros((self.ylimit[1]+1, self.xlimit[1]+1))
         plt.imshow(back_img, origin='lower', zorder=0)
@@ -146,10 +600,14 @@ class MapEnvironment(object):
         Draw the scene's obstacles on top of the given frame.
         @param plt Plot of a frame of the environment.
         '''
-        # plot obstacles
-        for obstacle in self.obstacles:
+        # plot obstacles (and the region the robot's center cannot enter, if the robot has a radius)
+        for obstacle in self.original_obstacles:
             obstacle_xs, obstacle_ys = zip(*list(obstacle.exterior.coords))
             plt.fill(obstacle_xs, obstacle_ys, "y", zorder=5)
+        if self.robot_radius > 0:
+            for obstacle in self.obstacles:
+                obstacle_xs, obstacle_ys = zip(*list(obstacle.exterior.coords))
+                plt.fill(obstacle_xs, obstacle_ys, "y", alpha=0.3, zorder=4)
         return plt
 
     def visualize_plan(self, plt, plan, color):
@@ -159,37 +617,56 @@ class MapEnvironment(object):
         @param plan The requested sequence of steps.
         @param color The requested color for the plan.
         '''
-        # add plan edges to the plt
-        for i in range(0, len(plan)-1):
-            plt.plot([plan[i,0],plan[i+1,0]], [plan[i,1],plan[i+1,1]], color=color, linewidth=1, zorder=20)
+        # add the plan to the plt as a single polyline (an empty plan, returned when the goal was not reached, has no segments)
+        plan = np.asarray(plan)
+        if len(plan) < 2:
+            return plt
+        plt.plot(plan[:,0], plan[:,1], color=color, linewidth=1, zorder=20)
         return plt 
 
-    def visualize_tree_edges(self, plt, tree_edges, color):
+    def visualize_tree_edges(self, plt, tree_edges, color, max_elements=None):
         '''
         Draw the set of the given tree edges on top of the given frame.
         @param plt Plot of a frame of the environment.
         @param tree_edges The requested set of edges.
         @param color The requested color for the plan.
+        @param max_elements If given, draw at most this many edges (evenly decimated).
         '''
-        # add plan edges to the plt
-        for tree_edge in tree_edges:
-            plt.plot([tree_edge[0][0],tree_edge[1][0]], [tree_edge[0][1],tree_edge[1][1]], color=color, zorder=10)
+        from matplotlib.collections import LineCollection
+
+        # add all tree edges to the plt as a single collection
+        segments = self.decimate(np.asarray(tree_edges, dtype=float).reshape(-1, 2, 2), max_elements)
+        plt.gca().add_collection(LineCollection(segments, colors=color, zorder=10))
         return plt
 
-    def visualize_expanded_nodes(self, plt, expanded_nodes, color):
+    def visualize_expanded_nodes(self, plt, expanded_nodes, color, max_elements=None):
         '''
         Draw the set of the given expanded nodes on top of the given frame.
         @param plt Plot of a frame of the environment.
         @param expanded_nodes The requested set of expanded states.
         @param color The requested color for the plan.
+        @param max_elements If given, draw at most this many nodes (evenly decimated).
         '''
-        # add plan edges to the plt
+        from matplotlib.collections import EllipseCollection
+
+        # add all nodes to the plt as a single collection of circles, sized in data units
         point_radius = 0.5
-        for expanded_node in expanded_nodes:
-            point_circ = plt.Circle(expanded_node, radius=point_radius, color=color, zorder=10)
-            plt.gca().add_patch(point_circ)
+        centers = self.decimate(np.asarray(expanded_nodes, dtype=float).reshape(-1, 2), max_elements)
+        ax = plt.gca()
+        ax.add_collection(EllipseCollection(widths=2*point_radius, heights=2*point_radius, angles=0, units='xy', offsets=centers,
+                                            offset_transform=ax.transData, facecolors=color, edgecolors='none', zorder=10))
         return plt
 
+    def decimate(self, elements, max_elements):
+        '''
+        Return an evenly spaced subset of at most max_elements of the given elements (or all of them if max_elements is None).
+        @param elements An array of elements (e.g. edges or nodes).
+        @param max_elements The maximal number of elements to keep.
+        '''
+        if max_elements is None or len(elements) <= max_elements:
+            return elements
+        return elements[np.linspace(0, len(elements)-1, max_elements).astype(int)]
+
     def visualize_point_location(self, plt, state, color):
         '''
         Draw a point of start/goal on top of the given frame.
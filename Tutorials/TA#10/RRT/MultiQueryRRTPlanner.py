@@ -0,0 +1,179 @@
+# This code was written by Yotam Granov
+
+import numpy as np
+from RRT.RRTTree import RRTTree
+from RRT.RRTArrayTree import RRTArrayTree
+from RRT.BatchSampler import BatchSampler
+import time
+
+class MultiQueryRRTPlanner(object):
+    def __init__(self, planning_env, ext_mode='E2', goal_prob=0.05, k=10, start=None, use_spatial_index=True, tree_backend='dict',
+                 seed=None, batch_size=256):
+        '''
+        Multi-query RRT: keeps a single tree rooted at the start alive across queries. Each new goal is first connected directly to
+        one of its nearest tree vertices, and the tree is only grown further (towards that goal) if no such connection is free.
+        @param planning_env The planning environment.
+        @param ext_mode 'E1' to extend all the way to the sample, or 'E2' to extend by a single step.
+        @param goal_prob The probability of sampling the current goal while growing the tree.
+        @param k The number of nearest tree vertices to try connecting each goal to.
+        @param start The root of the tree (defaults to the environment's start).
+        @param use_spatial_index If True, use a grid index for nearest-neighbor queries.
+        @param tree_backend The tree implementation, either 'dict' (RRTTree) or 'array' (RRTArrayTree).
+        @param seed Seed (or np.random.Generator) used for all random draws.
+        @param batch_size The number of samples drawn and validity-checked together.
+        '''
+        # set environment and search tree
+        self.planning_env = planning_env
+        if tree_backend == 'dict':
+            self.tree = RRTTree(self.planning_env, use_spatial_index=use_spatial_index)
+        elif tree_backend == 'array':
+            self.tree = RRTArrayTree(self.planning_env, use_spatial_index=use_spatial_index)
+        else:
+            raise ValueError('Unknown tree backend: {}'.format(tree_backend))
+        self.start = np.array(start if start is not None else planning_env.start, dtype=float)
+        self.tree.add_vertex(self.start)
+
+        # set search params
+        self.ext_mode = ext_mode
+        self.goal_prob = goal_prob
+        self.k = k
+        self.sampler = BatchSampler(planning_env, goal_prob, seed=seed, batch_size=batch_size)
+        self.stats = {}
+        self.num_queries = 0
+
+        # set step size for extensions (N-dimensional spaces set their own, in the units of their distance)
+        if planning_env.state_space is not None:
+            self.step_size = planning_env.state_space.step_size
+        elif planning_env.ylimit[1] < 100:
+            self.step_size = 0.2
+        else:
+            self.step_size = 10
+
+    def plan(self, goal=None, max_iter=None):
+        '''
+        Compute and return the plan from the root of the tree to the given goal, as a numpy array of states (positions).
+        @param goal The goal of this query (defaults to the environment's goal).
+        @param max_iter If given, grow the tree for at most this number of iterations (and return an empty plan if the goal was not reached).
+        '''
+        start_time = time.time()
+        env = self.planning_env
+        goal = np.array(goal if goal is not None else env.goal, dtype=float)
+        if env.state_space is not None:
+            goal = env.state_space.wrap(goal)
+        if not env.state_validity_checker(goal):
+            raise ValueError('Goal state must be within the map limits and collision free')
+        self.num_queries += 1
+        num_vertices = self.tree.get_num_vertices()
+
+        # try the existing tree first, and only grow it if the goal cannot be connected to it
+        goal_idx = self.connect_to_tree(goal)
+        connected_directly = goal_idx is not None
+        num_iter = 0
+        if goal_idx is None:
+            goal_idx, num_iter = self.grow_tree(goal, max_iter)
+
+        plan = np.array(self.tree.get_path_to_root(goal_idx)) if goal_idx is not None else np.array([])
+        total_cost = self.tree.get_cost(goal_idx) if goal_idx is not None else np.inf
+        total_time = time.time()-start_time
+        self.stats = {'num_iter': num_iter, 'cost': float(total_cost), 'time': total_time, 'num_vertices': self.tree.get_num_vertices(),
+                      'num_new_vertices': self.tree.get_num_vertices() - num_vertices, 'connected_directly': connected_directly}
+
+        print(f"Query {self.num_queries}: {num_iter} iterations, {self.stats['num_new_vertices']} new vertices")
+        print('Total cost of path: {:.3f}'.format(total_cost))
+        print('Total time: {:.3f} seconds'.format(total_time))
+        return plan
+
+    def connect_to_tree(self, goal):
+        '''
+        Connect the goal to the tree through the cheapest free edge from one of its k nearest vertices (comparing their cost-to-come
+        plus the edge length), and return the ID of the goal vertex (None if none of the edges is free).
+        @param goal The goal state.
+        '''
+        env = self.planning_env
+        goal_idx = self.tree.get_idx_for_state(goal)
+        if goal_idx is not None:
+            return goal_idx
+
+        n = self.tree.get_num_vertices()
+        if n == 1 or self.k == 1:
+            near_idx, near_state = self.tree.get_nearest_state(goal)
+            knn_idxs, knn_states = [near_idx], [near_state]
+        else:
+            knn_idxs, knn_states = self.tree.get_k_nearest_neighbors(goal, min(self.k, n - 1))
+
+        # check all candidate edges in a single batch
+        knn_states = np.array(knn_states, dtype=float).reshape(-1, len(goal))
+        dists = np.asarray(env.compute_distances(knn_states, goal), dtype=float)
+        valid = env.edge_validity_checker_batch(np.stack([knn_states, np.repeat(goal[None], len(knn_states), axis=0)], axis=1))
+        if not valid.any():
+            return None
+        costs = np.array([self.tree.get_cost(vid) for vid in knn_idxs]) + dists
+        best = np.nonzero(valid)[0][np.argmin(costs[valid])]
+        return self.add_goal(knn_idxs[best], goal, dists[best])
+
+    def grow_tree(self, goal, max_iter):
+        '''
+        Grow the tree with goal-biased samples until a new vertex can be connected to the goal.
+        Returns the ID of the goal vertex (None if not reached) and the number of iterations.
+        @param goal The goal state.
+        @param max_iter If given, the maximal number of iterations.
+        '''
+        env = self.planning_env
+        self.sampler.set_goal(goal)
+        samples = self.sampler.iterate()
+        num_iter = 0
+        while max_iter is None or num_iter < max_iter:
+            num_iter += 1
+
+            # Samples (goal-biased) are drawn and validity-checked in batches
+            s, _, is_valid = next(samples)
+            if not is_valid:
+                continue
+            near_idx, near_state = self.tree.get_nearest_state(s)
+
+            # Partial extensions, if enabled
+            new_state = self.extend(near_state, s) if self.ext_mode == 'E2' else np.array(s, dtype=float)
+            if np.array_equal(new_state, near_state):
+                continue
+            if self.ext_mode == 'E2' and not env.state_validity_checker(new_state):
+                continue
+            if not env.edge_validity_checker(near_state, new_state):
+                continue
+            new_idx = self.tree.add_vertex(new_state)
+            self.tree.add_edge(near_idx, new_idx, env.compute_distance(near_state, new_state))
+
+            # connect the goal once a new vertex reaches it, or gets within a step of it through a free edge
+            dist = env.compute_distance(new_state, goal)
+            if dist == 0:
+                return new_idx, num_iter
+            if dist <= self.step_size and env.edge_validity_checker(new_state, goal):
+                return self.add_goal(new_idx, goal, dist), num_iter
+        return None, num_iter
+
+    def add_goal(self, parent_idx, goal, dist):
+        '''
+        Add the goal as a vertex of the tree, and return its ID.
+        @param parent_idx The ID of its parent.
+        @param goal The goal state.
+        @param dist The distance between the parent and the goal.
+        '''
+        goal_idx = self.tree.add_vertex(goal)
+        self.tree.add_edge(parent_idx, goal_idx, dist)
+        return goal_idx
+
+    def extend(self, near_state, rand_state):
+        '''
+        Compute and return a new position for the sampled one, at most one step away from the nearest position.
+        @param near_state The nearest position to the sampled position.
+        @param rand_state The sampled position.
+        '''
+        # N-dimensional states are steered along the shortest (wrapped) difference, under the environment's distance
+        space = self.planning_env.state_space
+        if space is not None:
+            return space.steer(near_state, rand_state, self.step_size)[0]
+
+        vec = np.asarray(rand_state, dtype=float) - near_state
+        vec_mag = np.linalg.norm(vec)
+        if vec_mag <= self.step_size:
+            return np.array(rand_state, dtype=float)
+        return near_state + self.step_size * vec / vec_mag
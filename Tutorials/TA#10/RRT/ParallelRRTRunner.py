@@ -0,0 +1,96 @@
+# This code was written by Yotam Granov
+
+import os, io, time, contextlib
+import multiprocessing
+import numpy as np
+from RRT.RRTPlanner import RRTPlanner
+
+# the planning environment of the current worker process, set once by the pool initializer
+_worker_env = None
+
+def _init_worker(planning_env):
+    global _worker_env
+    _worker_env = planning_env
+
+def _run_seed(args):
+    '''
+    Run a single planner instance in a worker process, and return its plan together with its statistics.
+    '''
+    planner_class, planner_kwargs, plan_kwargs, seed = args
+    start_time = time.time()
+    planner = planner_class(planning_env=_worker_env, seed=seed, **planner_kwargs)
+    with contextlib.redirect_stdout(io.StringIO()):
+        plan = planner.plan(**plan_kwargs)
+    return {'seed': seed, 'pid': os.getpid(), 'plan': plan, 'cost': planner.stats['cost'],
+            'time': time.time()-start_time, 'stats': planner.stats}
+
+class ParallelRRTRunner(object):
+    def __init__(self, planning_env, planner_class=RRTPlanner, planner_kwargs=None, num_workers=None):
+        '''
+        Runs independent instances of a planner with distinct seeds in a pool of worker processes.
+        The planning environment is sent once to each worker (when the pool starts), not with every task.
+        @param planning_env The planning environment.
+        @param planner_class The planner to run, e.g. RRTPlanner, RRTStarPlanner or RRTConnectPlanner (must accept a seed argument).
+        @param planner_kwargs The arguments of the planner's constructor, other than the environment and the seed.
+        @param num_workers The number of worker processes (defaults to the number of CPUs).
+        '''
+        self.planning_env = planning_env
+        self.planner_class = planner_class
+        self.planner_kwargs = planner_kwargs if planner_kwargs is not None else {}
+        self.num_workers = num_workers if num_workers is not None else os.cpu_count()
+        self.results = []
+
+    def run(self, seeds, mode='first', **plan_kwargs):
+        '''
+        Run the planner once per seed, and return the chosen plan (an empty array if no run succeeded).
+        In 'first' mode the first plan found is returned and the remaining runs are cancelled,
+        in 'best' mode all runs are completed and the lowest-cost plan is returned.
+        The results of the completed runs are stored in self.results.
+        @param seeds The seeds of the runs (an int n is shorthand for range(n)).
+        @param mode Either 'first' or 'best'.
+        @param plan_kwargs Arguments passed to the planner's plan function (e.g. max_iter).
+        '''
+        if mode not in ('first', 'best'):
+            raise ValueError('Unknown mode: {}'.format(mode))
+        if isinstance(seeds, int):
+            seeds = range(seeds)
+        tasks = [(self.planner_class, self.planner_kwargs, plan_kwargs, seed) for seed in seeds]
+
+        start_time = time.time()
+        self.results = []
+        pool = multiprocessing.Pool(processes=self.num_workers, initializer=_init_worker, initargs=(self.planning_env,))
+        try:
+            for result in pool.imap_unordered(_run_seed, tasks):
+                self.results.append(result)
+                if mode == 'first' and len(result['plan']) > 0:
+                    break
+        finally:
+            # terminating the pool cancels the runs which are still in progress
+            pool.terminate()
+            pool.join()
+        self.total_time = time.time()-start_time
+
+        solved = [r for r in self.results if len(r['plan']) > 0]
+        if len(solved) == 0:
+            return np.array([])
+        return min(solved, key=lambda r: r['cost'])['plan']
+
+    def get_worker_times(self):
+        '''
+        Return the total planning time of each worker process (by process ID) over the completed runs.
+        '''
+        worker_times = {}
+        for result in self.results:
+            worker_times[result['pid']] = worker_times.get(result['pid'], 0) + result['time']
+        return worker_times
+
+    def print_report(self):
+        '''
+        Print the timing and cost of each completed run, and the total time per worker.
+        '''
+        for result in sorted(self.results, key=lambda r: r['time']):
+            print('seed {:>4}  worker {:>7}  time {:.3f}s  iterations {:>6}  cost {:.3f}'.format(
+                result['seed'], result['pid'], result['time'], result['stats']['num_iter'], result['cost']))
+        for pid, worker_time in self.get_worker_times().items():
+            print('worker {:>7}  total time {:.3f}s'.format(pid, worker_time))
+        print('Total wall-clock time: {:.3f} seconds'.format(self.total_time))
@@ -0,0 +1,134 @@
+# This code was written by Yotam Granov
+
+import numpy as np
+
+class PathShortcutter(object):
+    def __init__(self, planning_env, max_checks=None, batch_size=16, seed=None):
+        '''
+        Post-processes a plan by replacing sub-paths with straight collision-free shortcuts.
+        Only relies on the environment's edge_validity_checker_batch and compute_distance functions.
+        @param planning_env The planning environment.
+        @param max_checks If given, the maximal number of edges to collision-check (per call to shortcut).
+        @param batch_size The number of candidate shortcuts collision-checked together.
+        @param seed Seed (or np.random.Generator) used for the randomized shortcuts.
+        '''
+        self.planning_env = planning_env
+        self.max_checks = max_checks
+        self.batch_size = batch_size
+        self.rng = np.random.default_rng(seed)
+        self.num_checks = 0
+
+    def shortcut(self, plan, mode='both', num_iterations=100):
+        '''
+        Shorten the given plan, and return the new plan together with its cost.
+        @param plan The plan to shorten, given as an array of states (positions).
+        @param mode 'greedy' for greedy shortcutting, 'random' for randomized shortcutting, or 'both' (greedy first).
+        @param num_iterations The number of batches of randomized shortcuts to try.
+        '''
+        if mode not in ('greedy', 'random', 'both'):
+            raise ValueError('Unknown shortcutting mode: {}'.format(mode))
+        plan = np.array(plan, dtype=float)
+        self.num_checks = 0
+        if len(plan) > 2:
+            if mode in ('greedy', 'both'):
+                plan = self.shortcut_greedy(plan)
+            if mode in ('random', 'both'):
+                plan = self.shortcut_random(plan, num_iterations)
+        return plan, self.compute_cost(plan)
+
+    def get_remaining_checks(self):
+        '''
+        Returns the number of collision checks left in the budget.
+        '''
+        if self.max_checks is None:
+            return np.inf
+        return self.max_checks - self.num_checks
+
+    def check_edges(self, sources, targets):
+        '''
+        Collision-check a batch of edges, and count the checks against the budget.
+        @param sources An Nx2 array of the source states of the edges.
+        @param targets An Nx2 array of the destination states of the edges.
+        '''
+        self.num_checks += len(sources)
+        return self.planning_env.edge_validity_checker_batch(np.stack([sources, targets], axis=1))
+
+    def shortcut_greedy(self, plan):
+        '''
+        Connect each kept waypoint directly to the farthest later waypoint it can see.
+        Candidates are checked in batches from the far end, so a long shortcut costs a single batch.
+        @param plan The plan to shorten.
+        '''
+        kept = [0]; i = 0
+        while i < len(plan)-1:
+            next_i = i + 1
+            j = len(plan) - 1
+            while j > i + 1 and self.get_remaining_checks() > 0:
+                # candidate targets j, j-1, ..., down to (but excluding) i+1
+                num_candidates = int(min(self.batch_size, j - i - 1, self.get_remaining_checks()))
+                targets = np.arange(j, j - num_candidates, -1)
+                valid = self.check_edges(np.repeat(plan[i:i+1], num_candidates, axis=0), plan[targets])
+                if valid.any():
+                    next_i = targets[np.argmax(valid)]
+                    break
+                j -= num_candidates
+            kept.append(next_i)
+            i = next_i
+        return plan[kept]
+
+    def shortcut_random(self, plan, num_iterations):
+        '''
+        Repeatedly draw batches of random pairs of points along the path (not only at waypoints), and replace the sub-path
+        between each pair by a straight segment if it is collision free. The non-overlapping shortcuts with the largest gains
+        in each batch are applied together.
+        @param plan The plan to shorten.
+        @param num_iterations The number of batches to draw.
+        '''
+        for _ in range(num_iterations):
+            num_pairs = int(min(self.batch_size, self.get_remaining_checks()))
+            if num_pairs <= 0 or len(plan) < 3:
+                break
+
+            # arc-length parametrization of the path
+            segment_lengths = np.linalg.norm(plan[1:] - plan[:-1], axis=1)
+            arc = np.concatenate([[0], np.cumsum(segment_lengths)])
+            t = np.sort(self.rng.uniform(0, arc[-1], size=(num_pairs, 2)), axis=1)
+            segments = np.minimum(np.searchsorted(arc, t, side='right') - 1, len(plan) - 2)
+
+            # shortcuts within a single segment cannot shorten the path
+            pairs = np.nonzero(segments[:,0] < segments[:,1])[0]
+            if len(pairs) == 0:
+                continue
+            t, segments = t[pairs], segments[pairs]
+            fractions = (t - arc[segments]) / np.maximum(segment_lengths[segments], 1e-12)
+            points = plan[segments] + fractions[..., None] * (plan[segments + 1] - plan[segments])
+
+            valid = self.check_edges(points[:,0], points[:,1])
+            gains = (t[:,1] - t[:,0]) - np.linalg.norm(points[:,1] - points[:,0], axis=1)
+
+            # choose non-overlapping shortcuts by decreasing gain, then splice them in from the end of the path
+            chosen = []
+            for idx in np.argsort(-gains):
+                if not valid[idx] or gains[idx] <= 1e-9:
+                    continue
+                if all(t[idx,1] < t[c,0] or t[idx,0] > t[c,1] for c in chosen):
+                    chosen.append(idx)
+            for idx in sorted(chosen, key=lambda c: -t[c,0]):
+                (k1, k2), (p1, p2) = segments[idx], points[idx]
+                plan = np.concatenate([plan[:k1+1], [p1, p2], plan[k2+1:]])
+        return self.remove_duplicates(plan)
+
+    def remove_duplicates(self, plan):
+        '''
+        Remove consecutive repeated states from the plan.
+        @param plan The plan to clean.
+        '''
+        keep = np.concatenate([[True], np.linalg.norm(plan[1:] - plan[:-1], axis=1) > 1e-12])
+        return plan[keep]
+
+    def compute_cost(self, plan):
+        '''
+        Compute and return the plan cost, which is the sum of the distances between steps.
+        @param plan A given plan for the robot.
+        '''
+        return sum(self.planning_env.compute_distance(plan[i], plan[i+1]) for i in range(len(plan)-1))
@@ -0,0 +1,121 @@
+# This code was written by Yotam Granov
+
+import os, json, time, contextlib
+
+class PlannerStats(object):
+    def __init__(self, enabled=True, trace=False):
+        '''
+        Accumulates the wall time and the number of calls of each phase of a planner run, together with the planner's overall statistics.
+        Phases may nest (e.g. edge validity checks inside rewiring), in which case the inner time is also included in the outer phase.
+        @param enabled If False, the phases are not timed at all (and cost next to nothing).
+        @param trace If True, also keep every timed call, so that the run can be written as a Chrome trace.
+        '''
+        self.enabled = enabled or trace
+        self.trace = trace
+        self.null_phase = contextlib.nullcontext()
+        self.reset()
+
+    def reset(self):
+        '''
+        Clear all the accumulated statistics (called at the start of each run).
+        '''
+        self.start_time = time.perf_counter()
+        self.phase_times = {}
+        self.phase_calls = {}
+        self.totals = {}
+        self.events = []
+
+    def phase(self, name):
+        '''
+        Return a context manager which times the code inside it as a call of the given phase.
+        @param name The name of the phase.
+        '''
+        if not self.enabled:
+            return self.null_phase
+        return self.timed_phase(name)
+
+    @contextlib.contextmanager
+    def timed_phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.phase_times[name] = self.phase_times.get(name, 0) + end - start
+            self.phase_calls[name] = self.phase_calls.get(name, 0) + 1
+            if self.trace:
+                self.events.append((name, start, end))
+
+    def set_totals(self, totals):
+        '''
+        Store the planner's overall statistics of the run (iterations, cost, time, etc.) alongside the phases.
+        @param totals A dictionary of the overall statistics.
+        '''
+        self.totals = dict(totals)
+
+    def as_dict(self):
+        '''
+        Return the statistics as a dictionary with the overall totals, and the time and calls of each phase.
+        '''
+        phases = {name: {'time': self.phase_times[name], 'calls': self.phase_calls[name]} for name in self.phase_times}
+        return {'totals': self.totals, 'phases': phases}
+
+    def print_report(self):
+        '''
+        Print the time and calls of each phase, sorted by time, and the overall totals.
+        '''
+        for name in sorted(self.phase_times, key=lambda n: -self.phase_times[n]):
+            calls = self.phase_calls[name]
+            print('{:<22} {:>9.3f}s {:>10} calls {:>9.2f}us/call'.format(name, self.phase_times[name], calls, 1e6 * self.phase_times[name] / calls))
+        for name, value in self.totals.items():
+            print('{:<22} {:>10}'.format(name, value))
+
+    def write_chrome_trace(self, trace_file):
+        '''
+        Write the timed calls of the run in the Chrome trace event format (viewable in chrome://tracing or Perfetto).
+        Requires the statistics to have been collected with trace=True.
+        @param trace_file The path of the output JSON file.
+        '''
+        pid = os.getpid()
+        events = [{'name': name, 'cat': 'planner', 'ph': 'X', 'pid': pid, 'tid': 0,
+                   'ts': 1e6 * (start - self.start_time), 'dur': 1e6 * (end - start)} for name, start, end in self.events]
+        # the numeric totals are added as a counter event at the end of the run
+        counters = {name: value for name, value in self.totals.items() if isinstance(value, (int, float))}
+        if counters and self.events:
+            end_ts = 1e6 * (max(end for _, _, end in self.events) - self.start_time)
+            events.append({'name': 'totals', 'ph': 'C', 'pid': pid, 'tid': 0, 'ts': end_ts, 'args': counters})
+        with open(trace_file, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+class InstrumentedEnvironment(object):
+    def __init__(self, planning_env, stats):
+        '''
+        Wraps a planning environment, timing its collision-checking functions as phases of the given statistics.
+        All other attributes are forwarded to the wrapped environment.
+        @param planning_env The planning environment.
+        @param stats The PlannerStats to record to.
+        '''
+        self.planning_env = planning_env
+        self.stats = stats
+
+    def __getattr__(self, name):
+        # only called for attributes not found on the wrapper itself (guarded against recursion while unpickling)
+        if name in ('planning_env', 'stats'):
+            raise AttributeError(name)
+        return getattr(self.planning_env, name)
+
+    def state_validity_checker(self, state):
+        with self.stats.phase('state_validity'):
+            return self.planning_env.state_validity_checker(state)
+
+    def state_validity_checker_batch(self, states):
+        with self.stats.phase('state_validity_batch'):
+            return self.planning_env.state_validity_checker_batch(states)
+
+    def edge_validity_checker(self, state1, state2):
+        with self.stats.phase('edge_validity'):
+            return self.planning_env.edge_validity_checker(state1, state2)
+
+    def edge_validity_checker_batch(self, edges):
+        with self.stats.phase('edge_validity_batch'):
+            return self.planning_env.edge_validity_checker_batch(edges)
@@ -0,0 +1,346 @@
+# This code was written by Yotam Granov
+
+import math
+import numpy as np
+from RRT.GridIndex import GridIndex
+from RRT.RRTTree import RRTVertex
+
+class RRTArrayTree(object):
+    def __init__(self, planning_env, task="mp", use_spatial_index=True, capacity=1024):
+        '''
+        An RRT tree that stores its states, costs and parent IDs in preallocated NumPy arrays (structure-of-arrays),
+        exposing the same interface as RRTTree.
+        @param planning_env The planning environment.
+        @param use_spatial_index If True, use a grid index for nearest-neighbor queries, otherwise use vectorized brute-force search.
+        @param capacity The initial number of preallocated vertices (the arrays are doubled whenever they fill up).
+        '''
+        self.planning_env = planning_env
+        self.task = task
+        self.dim = len(planning_env.start)
+        self.num_vertices = 0
+        self.states = np.zeros((capacity, self.dim))
+        self.costs = np.zeros(capacity)
+        self.parents = np.full(capacity, -1, dtype=np.int64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.num_alive = 0
+        self.inspected_points = {}
+        self.state_to_idx = {}
+        self.children = {}
+
+        # the longest edge ever added (edge costs are edge lengths), which bounds the box queries over the edges
+        self.max_edge_length = 0
+
+        # changes since the last tree delta (only tracked once start_delta_log is called)
+        self.delta_start, self.delta_rewired, self.delta_removed = None, None, None
+
+        # the grid index is planar, so the states of N-dimensional environments are always searched by brute force
+        self.use_spatial_index = use_spatial_index and planning_env.state_space is None
+        if self.use_spatial_index:
+            extent = max(planning_env.xlimit[1]-planning_env.xlimit[0], planning_env.ylimit[1]-planning_env.ylimit[0], 1)
+            self.spatial_index = GridIndex(cell_size=extent/16, min_cell_size=extent/4096)
+
+    def get_root_id(self):
+        '''
+        Returns the ID of the root in the tree.
+        '''
+        return 0
+
+    def grow(self):
+        '''
+        Double the capacity of the underlying arrays.
+        '''
+        capacity = 2 * len(self.costs)
+        states = np.zeros((capacity, self.dim))
+        states[:self.num_vertices] = self.states[:self.num_vertices]
+        costs = np.zeros(capacity)
+        costs[:self.num_vertices] = self.costs[:self.num_vertices]
+        parents = np.full(capacity, -1, dtype=np.int64)
+        parents[:self.num_vertices] = self.parents[:self.num_vertices]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self.num_vertices] = self.alive[:self.num_vertices]
+        self.states, self.costs, self.parents, self.alive = states, costs, parents, alive
+
+    def add_vertex(self, state, inspected_points=None):
+        '''
+        Add a state to the tree.
+        @param state state to add to the tree.
+        '''
+        if self.num_vertices == len(self.costs):
+            self.grow()
+        vid = self.num_vertices
+        self.states[vid] = state
+        self.costs[vid] = 0
+        self.parents[vid] = -1
+        self.alive[vid] = True
+        self.num_vertices += 1
+        self.num_alive += 1
+        if inspected_points is not None:
+            self.inspected_points[vid] = inspected_points
+        self.state_to_idx.setdefault(self.get_state_key(state), vid)
+        if self.use_spatial_index:
+            self.spatial_index.insert(vid, state)
+        return vid
+
+    def add_edge(self, sid, eid, edge_cost):
+        '''
+        Adds an edge in the tree.
+        @param sid start state ID
+        @param eid end state ID
+        '''
+        self.parents[eid] = sid
+        self.children.setdefault(sid, []).append(eid)
+        self.costs[eid] = self.costs[sid] + edge_cost
+        self.max_edge_length = max(self.max_edge_length, edge_cost)
+
+    def get_num_vertices(self):
+        '''
+        Returns the number of vertices in the tree.
+        '''
+        return self.num_alive
+
+    def get_vertex_ids(self):
+        '''
+        Returns the IDs of all vertices in the tree.
+        '''
+        return np.nonzero(self.alive[:self.num_vertices])[0].tolist()
+
+    def has_vertex(self, vid):
+        '''
+        Check if a vertex with the given ID is in the tree.
+        @param vid The vertex ID.
+        '''
+        return 0 <= vid < self.num_vertices and bool(self.alive[vid])
+
+    def remove_subtree(self, vid):
+        '''
+        Removes a vertex and all of its descendants from the tree, and returns the number of removed vertices.
+        Removed vertices are only marked as dead, their IDs are never reused.
+        @param vid The ID of the root of the removed subtree.
+        '''
+        if self.parents[vid] >= 0:
+            self.children[int(self.parents[vid])].remove(vid)
+        stack = [vid]; num_removed = 0
+        while stack:
+            u = stack.pop()
+            stack.extend(self.children.pop(u, []))
+            self.parents[u] = -1
+            self.alive[u] = False
+            if self.delta_removed is not None and u < self.delta_start:
+                self.delta_removed.add(u)
+            state_key = self.get_state_key(self.states[u])
+            if self.state_to_idx.get(state_key) == u:
+                del self.state_to_idx[state_key]
+            if self.use_spatial_index:
+                self.spatial_index.remove(u)
+            num_removed += 1
+        self.num_alive -= num_removed
+        return num_removed
+
+    def get_state(self, vid):
+        '''
+        Returns the state of a vertex.
+        @param vid The vertex ID.
+        '''
+        return self.states[vid]
+
+    def get_cost(self, vid):
+        '''
+        Returns the cost-to-come of a vertex.
+        @param vid The vertex ID.
+        '''
+        return self.costs[vid]
+
+    def set_cost(self, vid, cost):
+        '''
+        Sets the cost-to-come of a vertex.
+        @param vid The vertex ID.
+        @param cost The new cost.
+        '''
+        self.costs[vid] = cost
+
+    def get_parent(self, vid):
+        '''
+        Returns the ID of the parent of a vertex (None for the root).
+        @param vid The vertex ID.
+        '''
+        parent_id = self.parents[vid]
+        return int(parent_id) if parent_id >= 0 else None
+
+    def set_parent(self, vid, parent_id):
+        '''
+        Replaces the parent of a vertex, without changing its cost.
+        @param vid The vertex ID.
+        @param parent_id The ID of the new parent.
+        '''
+        if self.parents[vid] >= 0:
+            self.children[int(self.parents[vid])].remove(vid)
+        self.parents[vid] = parent_id
+        self.children.setdefault(parent_id, []).append(vid)
+        self.max_edge_length = max(self.max_edge_length, float(np.linalg.norm(self.states[vid] - self.states[parent_id])))
+        if self.delta_rewired is not None:
+            self.delta_rewired.add(vid)
+
+    def get_children(self, vid):
+        '''
+        Returns the IDs of the children of a vertex.
+        @param vid The vertex ID.
+        '''
+        return self.children.get(vid, [])
+
+    def update_subtree_cost(self, vid, cost):
+        '''
+        Sets the cost-to-come of a vertex, and propagates the change in cost to all of its descendants.
+        @param vid The vertex ID.
+        @param cost The new cost.
+        '''
+        delta = cost - self.costs[vid]
+        stack = [vid]
+        while stack:
+            u = stack.pop()
+            self.costs[u] += delta
+            stack.extend(self.children.get(u, []))
+
+    def start_delta_log(self):
+        '''
+        Start tracking the changes to the tree, to be collected by pop_delta.
+        '''
+        self.delta_start = self.num_vertices
+        self.delta_rewired = set()
+        self.delta_removed = set()
+
+    def pop_delta(self):
+        '''
+        Return the changes to the tree since the last delta (or since start_delta_log): the IDs, states and parent IDs
+        of the new vertices, the IDs and new parent IDs of the rewired vertices, and the IDs of the removed vertices.
+        Parent IDs of -1 mark the root. Vertices both added and removed since the last delta are left out.
+        '''
+        new_ids = [vid for vid in range(self.delta_start, self.num_vertices) if self.has_vertex(vid)]
+        rewired_ids = sorted(vid for vid in self.delta_rewired if vid < self.delta_start and self.has_vertex(vid))
+        get_parent_id = lambda vid: -1 if self.get_parent(vid) is None else self.get_parent(vid)
+        delta = {
+            'new_ids': np.array(new_ids, dtype=np.int64),
+            'new_states': np.array([self.get_state(vid) for vid in new_ids], dtype=float).reshape(len(new_ids), len(self.planning_env.start)),
+            'new_parents': np.array([get_parent_id(vid) for vid in new_ids], dtype=np.int64),
+            'rewired_ids': np.array(rewired_ids, dtype=np.int64),
+            'rewired_parents': np.array([get_parent_id(vid) for vid in rewired_ids], dtype=np.int64),
+            'removed_ids': np.array(sorted(self.delta_removed), dtype=np.int64),
+        }
+        self.start_delta_log()
+        return delta
+
+    def is_goal_exists(self, state):
+        '''
+        Check if goal exists.
+        @param state state to check if exists.
+        '''
+        return self.get_idx_for_state(state=state) is not None
+
+    def get_vertex_for_state(self, state):
+        '''
+        Search for the vertex with the given state and return a copy of it if exists
+        @param state state to check if exists.
+        '''
+        v_idx = self.get_idx_for_state(state=state)
+        if v_idx is not None:
+            return RRTVertex(state=self.states[v_idx].copy(), cost=self.costs[v_idx], inspected_points=self.inspected_points.get(v_idx))
+        return None
+
+    def get_idx_for_state(self, state):
+        '''
+        Search for the vertex with the given state and return the index if exists
+        @param state state to check if exists.
+        '''
+        return self.state_to_idx.get(self.get_state_key(state))
+
+    def get_state_key(self, state):
+        '''
+        Return a hashable key for the given state, used to index the vertices by their states.
+        @param state The state to convert.
+        '''
+        if len(state) == 2:
+            return (float(state[0]), float(state[1]))
+        return tuple(float(x) for x in state)
+
+    def get_path_to_root(self, vid):
+        '''
+        Return the states along the tree branch from the root to the given vertex, by following the parent IDs.
+        @param vid The ID of the last vertex in the path.
+        '''
+        path_ids = [vid]
+        while self.parents[vid] >= 0:
+            vid = self.parents[vid]
+            path_ids.append(vid)
+        return list(self.states[path_ids[::-1]])
+
+    def compute_distances(self, state):
+        '''
+        Return the distances from the given state to all vertices in the tree (vectorized by the environment's distance).
+        @param state Sampled state.
+        '''
+        dists = self.planning_env.compute_distances(self.states[:self.num_vertices], state)
+        dists[~self.alive[:self.num_vertices]] = np.inf
+        return dists
+
+    def get_nearest_state(self, state):
+        '''
+        Find the nearest vertex for the given state and returns its state index and state
+        @param state Sampled state.
+        '''
+        if self.use_spatial_index:
+            vid, _ = self.spatial_index.get_nearest(state)
+        else:
+            vid = int(np.argmin(self.compute_distances(state)))
+        return vid, self.states[vid]
+
+    def get_k_nearest_neighbors(self, state, k):
+        '''
+        Return k-nearest neighbors
+        @param state Sampled state.
+        @param k Number of nearest neighbors to retrieve.
+        '''
+        if self.use_spatial_index:
+            knn_ids, _ = self.spatial_index.get_k_nearest(state, k)
+        else:
+            knn_ids = np.argpartition(self.compute_distances(state), k)[:k].tolist()
+            knn_ids = [vid for vid in knn_ids if self.alive[vid]]
+        return knn_ids, [self.states[vid] for vid in knn_ids]
+
+    def get_neighbors_within_radius(self, state, radius):
+        '''
+        Return all neighbors within a given radius
+        @param state Sampled state.
+        @param radius The search radius.
+        '''
+        if self.use_spatial_index:
+            ids, _ = self.spatial_index.get_within_radius(state, radius)
+        else:
+            ids = np.nonzero(self.compute_distances(state) <= radius)[0].tolist()
+        return ids, [self.states[vid] for vid in ids]
+
+    def get_edges_in_box(self, bounds):
+        '''
+        Return the IDs of the vertices whose edges (to their parents) have bounding boxes overlapping the given box.
+        Both endpoints of such an edge are within the longest edge length of the box, so only the vertices around it are visited.
+        @param bounds The box, given as (min_x, min_y, max_x, max_y).
+        '''
+        min_x, min_y, max_x, max_y = bounds
+        if self.use_spatial_index:
+            center = ((min_x + max_x) / 2, (min_y + max_y) / 2)
+            radius = math.hypot(max_x - min_x, max_y - min_y) / 2 + self.max_edge_length
+            vids, _ = self.spatial_index.get_within_radius(center, radius)
+            vids = np.array(vids, dtype=np.int64)
+        else:
+            vids = np.nonzero(self.alive[:self.num_vertices])[0]
+
+        vids = vids[self.parents[vids] >= 0]
+        states, parent_states = self.states[vids, :2], self.states[self.parents[vids], :2]
+        low, high = np.minimum(states, parent_states), np.maximum(states, parent_states)
+        overlap = (low[:,0] <= max_x) & (high[:,0] >= min_x) & (low[:,1] <= max_y) & (high[:,1] >= min_y)
+        return vids[overlap].tolist()
+
+    def get_edges_as_states(self):
+        '''
+        Return the edges in the tree as an array of pairs of states (positions)
+        '''
+        child_ids = np.nonzero(self.parents[:self.num_vertices] >= 0)[0]
+        return np.stack([self.states[self.parents[child_ids]], self.states[child_ids]], axis=1)
@@ -0,0 +1,128 @@
+# This code was written by Yotam Granov
+
+# Benchmarks RRT, RRT with adaptive (dynamic-domain) E2 extensions and RRT* over a sweep of maps, extension modes, goal biases, k values (k=0 is the log mode) and seeds.
+# Every run is recorded to CSV/JSON, and a summary (success rate, median and IQR of each metric) is printed per configuration.
+# Run from the TA#10 directory: python -m RRT.RRTBenchmark --maps RRT/map1.json --seeds 10 --csv runs.csv --json runs.json
+
+import os, io, csv, json, argparse, itertools, contextlib
+import numpy as np
+from RRT.MapEnvironment import MapEnvironment
+from RRT.RRTPlanner import RRTPlanner
+from RRT.RRTStarPlanner import RRTStarPlanner
+
+FIELDS = ['map', 'planner', 'ext_mode', 'goal_prob', 'k', 'seed', 'success', 'num_iter', 'num_rewires', 'num_failed_extensions', 'time', 'cost',
+          'num_vertices']
+CONFIG_FIELDS = ['map', 'planner', 'ext_mode', 'goal_prob', 'k']
+METRICS = ['num_iter', 'num_rewires', 'num_failed_extensions', 'time', 'cost', 'num_vertices']
+
+def get_configs(args):
+    '''
+    Return the swept configurations as (map, planner, ext_mode, goal_prob, k) tuples (k is None for RRT).
+    The adaptive RRT only runs with E2 extensions.
+    '''
+    configs = []
+    for map_file, planner, ext_mode, goal_prob in itertools.product(args.maps, args.planners, args.ext_modes, args.goal_probs):
+        if planner == 'rrt-adaptive' and ext_mode != 'E2':
+            continue
+        for k in (args.ks if planner == 'rrtstar' else [None]):
+            configs.append((map_file, planner, ext_mode, goal_prob, k))
+    return configs
+
+def run(planning_env, config, seed, max_iter):
+    '''
+    Run a single planner instance quietly, and return its record.
+    '''
+    map_file, planner, ext_mode, goal_prob, k = config
+    if planner in ('rrt', 'rrt-adaptive'):
+        rrt = RRTPlanner(planning_env=planning_env, ext_mode=ext_mode, goal_prob=goal_prob, seed=seed, adaptive=planner == 'rrt-adaptive')
+    else:
+        rrt = RRTStarPlanner(planning_env=planning_env, ext_mode=ext_mode, goal_prob=goal_prob, k=k, seed=seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        plan = rrt.plan(max_iter=max_iter)
+    stats = rrt.stats
+    return {'map': map_file, 'planner': planner, 'ext_mode': ext_mode, 'goal_prob': goal_prob, 'k': k, 'seed': seed,
+            'success': len(plan) > 0, 'num_iter': stats['num_iter'], 'num_rewires': stats.get('num_rewires', 0),
+            'num_failed_extensions': stats['num_failed_extensions'], 'time': stats['time'], 'cost': stats['cost'], 'num_vertices': stats['num_vertices']}
+
+def summarize(records, config_fields=CONFIG_FIELDS, metrics=METRICS):
+    '''
+    Group the records by configuration, and return the success rate and the median and interquartile range of each metric
+    (over the successful runs) for each configuration.
+    @param config_fields The fields identifying a configuration.
+    @param metrics The fields to summarize.
+    '''
+    groups = {}
+    for record in records:
+        groups.setdefault(tuple(record[f] for f in config_fields), []).append(record)
+
+    summary = []
+    for config, group in groups.items():
+        solved = [r for r in group if r['success']]
+        row = dict(zip(config_fields, config))
+        row.update({'num_runs': len(group), 'success_rate': len(solved) / len(group)})
+        for metric in metrics:
+            values = [r[metric] for r in solved]
+            q1, median, q3 = np.percentile(values, [25, 50, 75]) if values else (np.nan, np.nan, np.nan)
+            row.update({metric + '_median': float(median), metric + '_iqr': float(q3 - q1)})
+        summary.append(row)
+    return summary
+
+def print_summary(summary):
+    '''
+    Print the summary as a table.
+    '''
+    print('{:<18} {:<12} {:<4} {:>5} {:>4} {:>8} {:>16} {:>8} {:>18} {:>16} {:>12}'.format(
+        'map', 'planner', 'ext', 'bias', 'k', 'success', 'iters (IQR)', 'failed', 'time [s] (IQR)', 'cost (IQR)', 'tree size'))
+    for row in summary:
+        print('{:<18} {:<12} {:<4} {:>5} {:>4} {:>8.0%} {:>8.0f} ({:>5.0f}) {:>8.0f} {:>9.3f} ({:>6.3f}) {:>8.3f} ({:>5.3f}) {:>12.0f}'.format(
+            os.path.basename(row['map']), row['planner'], row['ext_mode'], row['goal_prob'], '-' if row['k'] is None else row['k'],
+            row['success_rate'], row['num_iter_median'], row['num_iter_iqr'], row['num_failed_extensions_median'], row['time_median'],
+            row['time_iqr'], row['cost_median'], row['cost_iqr'], row['num_vertices_median']))
+
+def to_json(value):
+    '''
+    Replace the non-finite floats in the given (nested) records with None.
+    '''
+    if isinstance(value, dict):
+        return {key: to_json(v) for key, v in value.items()}
+    if isinstance(value, list):
+        return [to_json(v) for v in value]
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark sweep for RRT, adaptive RRT and RRT*.')
+    parser.add_argument('--maps', nargs='+', default=['RRT/map1.json'])
+    parser.add_argument('--planners', nargs='+', default=['rrt', 'rrtstar'], choices=['rrt', 'rrt-adaptive', 'rrtstar'])
+    parser.add_argument('--ext-modes', nargs='+', default=['E1', 'E2'], choices=['E1', 'E2'])
+    parser.add_argument('--goal-probs', nargs='+', type=float, default=[0.05, 0.2])
+    parser.add_argument('--ks', nargs='+', type=int, default=[5, 0], help='k values for RRT* (0 for the log mode)')
+    parser.add_argument('--seeds', type=int, default=10)
+    parser.add_argument('--max-iter', type=int, default=20000, help='runs that do not reach the goal within this budget count as failures')
+    parser.add_argument('--csv', default=None, help='path of a CSV file to write the per-run records to')
+    parser.add_argument('--json', default=None, help='path of a JSON file to write the per-run records and the summary to')
+    args = parser.parse_args()
+
+    # the maps are only parsed once
+    planning_envs = {map_file: MapEnvironment(json_file=map_file, headless=True) for map_file in args.maps}
+    records = []
+    for config in get_configs(args):
+        for seed in range(args.seeds):
+            records.append(run(planning_envs[config[0]], config, seed, args.max_iter))
+
+    summary = summarize(records)
+    print_summary(summary)
+
+    if args.csv is not None:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(records)
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            # failed runs and empty groups have non-finite values, which are stored as nulls to keep the file valid JSON
+            json.dump(to_json({'records': records, 'summary': summary}), f, indent=2)
+
+if __name__ == '__main__':
+    main()
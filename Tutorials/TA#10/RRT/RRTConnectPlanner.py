@@ -0,0 +1,163 @@
+# This code was written by Yotam Granov
+
+import numpy as np
+from RRT.RRTTree import RRTTree
+from RRT.RRTArrayTree import RRTArrayTree
+from RRT.BatchSampler import BatchSampler
+import time
+
+# results of extending a tree towards a state
+TRAPPED, ADVANCED, REACHED = 0, 1, 2
+
+class RRTConnectPlanner(object):
+    def __init__(self, planning_env, ext_mode='E2', use_spatial_index=True, tree_backend='dict', seed=None, batch_size=256):
+        '''
+        Bidirectional RRT-Connect: grows one tree from the start and one from the goal, alternating between them. Each tree is
+        extended towards a random sample, and the other tree then greedily tries to connect to the new vertex.
+        @param planning_env The planning environment.
+        @param ext_mode 'E1' to extend all the way to the sample, or 'E2' to extend by a single step.
+        @param use_spatial_index If True, use a grid index for nearest-neighbor queries.
+        @param tree_backend The tree implementation, either 'dict' (RRTTree) or 'array' (RRTArrayTree).
+        @param seed Seed (or np.random.Generator) used for all random draws.
+        @param batch_size The number of samples drawn and validity-checked together.
+        '''
+        # set environment and search trees
+        self.planning_env = planning_env
+        if tree_backend == 'dict':
+            tree_class = RRTTree
+        elif tree_backend == 'array':
+            tree_class = RRTArrayTree
+        else:
+            raise ValueError('Unknown tree backend: {}'.format(tree_backend))
+        self.start_tree = tree_class(self.planning_env, use_spatial_index=use_spatial_index)
+        self.goal_tree = tree_class(self.planning_env, use_spatial_index=use_spatial_index)
+
+        # set search params (the goal is a tree root, so no goal biasing is needed)
+        self.ext_mode = ext_mode
+        self.sampler = BatchSampler(planning_env, goal_prob=0, seed=seed, batch_size=batch_size)
+        self.stats = {}
+
+        # set step size for extensions (N-dimensional spaces set their own, in the units of their distance)
+        if planning_env.state_space is not None:
+            self.step_size = planning_env.state_space.step_size
+        elif planning_env.ylimit[1] < 100:
+            self.step_size = 0.2
+        else:
+            self.step_size = 10
+
+    def plan(self, max_iter=None):
+        '''
+        Compute and return the plan. The function should return a numpy array containing the states (positions) of the robot.
+        @param max_iter If given, stop after this number of iterations (and return an empty plan if the trees were not connected).
+        '''
+        start_time = time.time()
+
+        env = self.planning_env
+        self.start_tree.add_vertex(env.start)
+        self.goal_tree.add_vertex(env.goal)
+
+        samples = self.sampler.iterate()
+        tree_a, tree_b = self.start_tree, self.goal_tree
+        num_iter = 0; plan = []
+        while max_iter is None or num_iter < max_iter:
+            num_iter += 1
+            s, _, is_valid = next(samples)
+
+            # Is the sample in the free space?
+            if is_valid:
+                status, new_idx = self.extend_tree(tree_a, s)
+                if status != TRAPPED:
+                    # greedily grow the other tree towards the new vertex
+                    new_state = tree_a.get_state(new_idx)
+                    status, connect_idx = self.connect_tree(tree_b, new_state)
+                    if status == REACHED:
+                        plan = self.get_connected_path(tree_a, new_idx, tree_b, connect_idx)
+                        break
+
+            # alternate between the trees
+            tree_a, tree_b = tree_b, tree_a
+
+        print(f"Total number of iterations needed to reach goal: {num_iter}")
+
+        total_time = time.time()-start_time
+        total_cost = self.compute_cost(plan) if len(plan) > 0 else np.inf
+        print('Total cost of path: {:.3f}'.format(total_cost))
+        print('Total time: {:.3f} seconds'.format(total_time))
+
+        self.stats = {'num_iter': num_iter, 'cost': float(total_cost), 'time': total_time,
+                      'num_vertices': self.start_tree.get_num_vertices() + self.goal_tree.get_num_vertices()}
+        return np.array(plan)
+
+    def extend_tree(self, tree, state):
+        '''
+        Extend the tree from its nearest vertex towards the given state. Returns the extension status and the ID of the new vertex
+        (or of the existing vertex at the state, if it is already in the tree).
+        @param tree The tree to extend.
+        @param state The state to extend towards.
+        '''
+        env = self.planning_env
+        nearest_idx, nearest_state = tree.get_nearest_state(state)
+        dist = env.compute_distance(nearest_state, state)
+        if dist == 0:
+            return REACHED, nearest_idx
+
+        # Partial extensions, if enabled (N-dimensional states are steered along the shortest (wrapped) difference)
+        if self.ext_mode == 'E2' and dist > self.step_size:
+            if env.state_space is not None:
+                new_state, _ = env.state_space.steer(nearest_state, state, self.step_size)
+            else:
+                new_state = nearest_state + self.step_size * (np.asarray(state, dtype=float) - nearest_state) / dist
+            status = ADVANCED
+        else:
+            new_state = np.array(state, dtype=float)
+            status = REACHED
+
+        # Does the edge between the new state and its nearest tree node collide with any obstacles?
+        if not env.edge_validity_checker(nearest_state, new_state):
+            return TRAPPED, None
+        new_idx = tree.add_vertex(new_state)
+        tree.add_edge(nearest_idx, new_idx, env.compute_distance(nearest_state, new_state))
+        return status, new_idx
+
+    def connect_tree(self, tree, state):
+        '''
+        Repeatedly extend the tree towards the given state until it is reached or the extension gets trapped.
+        Returns the last extension status and the ID of the last vertex added.
+        @param tree The tree to extend.
+        @param state The state to connect to.
+        '''
+        status, last_idx = ADVANCED, None
+        while status == ADVANCED:
+            status, new_idx = self.extend_tree(tree, state)
+            if new_idx is not None:
+                last_idx = new_idx
+        return status, last_idx
+
+    def get_connected_path(self, tree_a, idx_a, tree_b, idx_b):
+        '''
+        Return the path from the start to the goal through the connection between the two trees.
+        @param tree_a The tree holding the first endpoint of the connection.
+        @param idx_a The ID of the first endpoint in tree_a.
+        @param tree_b The tree holding the second endpoint of the connection (at the same state).
+        @param idx_b The ID of the second endpoint in tree_b.
+        '''
+        if tree_a is not self.start_tree:
+            tree_a, idx_a, tree_b, idx_b = tree_b, idx_b, tree_a, idx_a
+
+        # both endpoints share the connecting state, so it is only kept once
+        start_path = tree_a.get_path_to_root(idx_a)
+        goal_path = tree_b.get_path_to_root(idx_b)
+        return start_path + goal_path[::-1][1:]
+
+    def compute_cost(self, plan):
+        '''
+        Compute and return the plan cost, which is the sum of the distances between steps.
+        @param plan A given plan for the robot.
+        '''
+        return sum(self.planning_env.compute_distance(plan[i], plan[i+1]) for i in range(len(plan)-1))
+
+    def get_edges_as_states(self):
+        '''
+        Return the edges of both trees as pairs of states (positions), e.g. for visualization.
+        '''
+        return list(self.start_tree.get_edges_as_states()) + list(self.goal_tree.get_edges_as_states())
@@ -2,115 +2,243 @@
 
 import numpy as np
 from RRT.RRTTree import RRTTree
+from RRT.RRTArrayTree import RRTArrayTree
+from RRT.BatchSampler import BatchSampler
+from RRT.PlannerStats import PlannerStats, InstrumentedEnvironment
 import time
 
 class RRTPlanner(object):
-    def __init__(self, planning_env, ext_mode, goal_prob):
-        # set environment and search tree
+    def __init__(self, planning_env, ext_mode, goal_prob, use_spatial_index=True, tree_backend='dict', seed=None, batch_size=256, instrument=False, trace=False, sequence='uniform',
+                 adaptive=False, domain_radius=None):
+        # set environment and search tree (when instrumented, the environment's collision checks are timed per phase)
+        self.profile = PlannerStats(enabled=instrument, trace=trace)
+        if self.profile.enabled:
+            planning_env = InstrumentedEnvironment(planning_env, self.profile)
         self.planning_env = planning_env
-        self.tree = RRTTree(self.planning_env)
+        if tree_backend == 'dict':
+            self.tree = RRTTree(self.planning_env, use_spatial_index=use_spatial_index)
+        elif tree_backend == 'array':
+            self.tree = RRTArrayTree(self.planning_env, use_spatial_index=use_spatial_index)
+        else:
+            raise ValueError('Unknown tree backend: {}'.format(tree_backend))
 
         # set search params
         self.ext_mode = ext_mode
         self.goal_prob = goal_prob
+        self.sampler = BatchSampler(planning_env, goal_prob, seed=seed, batch_size=batch_size, sequence=sequence)
+        self.stats = {}
 
-        # set step size for extensions
-        if planning_env.ylimit[1] < 100:
+        # set step size for extensions (N-dimensional spaces set their own, in the units of their distance)
+        if planning_env.state_space is not None:
+            self.step_size = planning_env.state_space.step_size
+        elif planning_env.ylimit[1] < 100:
             self.step_size = 0.2
         else:
             self.step_size = 10
 
-    def plan(self):
+        # adaptive E2 extensions (dynamic-domain RRT): the step length of each extension follows the collision history of its
+        # vertex (and the clearance around it, if the map has a raster), and vertices at which extensions collided only accept
+        # samples within their (adaptive) domain radius
+        if adaptive and ext_mode != 'E2':
+            raise ValueError('Adaptive extensions require the E2 extension mode')
+        self.adaptive = adaptive
+        self.max_step_size = 10 * self.step_size
+        # the domains must stay well beyond the longest extensions, or the vertices at obstacles would stop growing altogether
+        self.domain_radius = domain_radius if domain_radius is not None else 4 * self.max_step_size
+        self.use_clearance = getattr(planning_env, 'raster_resolution', None) is not None and planning_env.state_space is None
+
+    def plan(self, max_iter=None, return_stats=False):
         '''
         Compute and return the plan. The function should return a numpy array containing the states (positions) of the robot.
+        @param max_iter If given, stop after this number of iterations (and return an empty plan if the goal was not reached).
+        @param return_stats If True, return the PlannerStats of the run (per-phase times and calls, if instrumented) along with the plan.
+        '''
+        for _ in self.grow_tree(max_iter=max_iter):
+            pass
+        plan = self.get_plan()
+
+        print(f"Total number of iterations needed to reach goal: {self.stats['num_iter']}")
+        print('Total cost of path: {:.3f}'.format(self.stats['cost']))
+        print('Total time: {:.3f} seconds'.format(self.stats['time']))
+        if return_stats:
+            return plan, self.profile
+        return plan
+
+    def plan_deltas(self, delta_interval=100, max_iter=None):
+        '''
+        A generator which runs the planner and yields the changes to the tree (see RRTTree.pop_delta) every delta_interval iterations,
+        e.g. for progressive visualization or for appending to a TreeDeltaLog. Each delta also holds the iteration number and the
+        cost of the solution so far. The last delta is marked as done, and holds the plan.
+        @param delta_interval The number of iterations between deltas.
+        @param max_iter If given, stop after this number of iterations.
+        '''
+        self.tree.start_delta_log()
+        yield from self.grow_tree(max_iter=max_iter, delta_interval=delta_interval)
+        yield self.get_tree_delta(self.stats['num_iter'], self.stats['cost'], plan=self.get_plan())
+
+    def grow_tree(self, max_iter=None, delta_interval=None):
+        '''
+        Grow the tree until the goal is reached. This is a generator, which yields a tree delta every delta_interval iterations
+        (if given). The ID of the goal vertex (None if not reached) and the statistics of the run are stored once it ends.
+        @param max_iter If given, stop after this number of iterations.
+        @param delta_interval If given, the number of iterations between tree deltas.
         '''
         start_time = time.time()
+        self.profile.reset()
 
         env = self.planning_env
         self.tree.add_vertex(env.start)
         
-        goal_added = False; num_iter = 0; plan = []
-        while not goal_added:
-            num_iter += 1
-            goal = False; 
-
-            # Here we manually add goal biasing
-            p = np.random.uniform()
-            if p < self.goal_prob:
-                s = env.goal
-                goal = True
-            else:
-                x = np.random.uniform(env.xlimit[0], env.xlimit[1])
-                y = np.random.uniform(env.ylimit[0], env.ylimit[1])
-                s = [x,y]
-
-            # Is the sample in the free space?
-            if env.state_validity_checker(s):
-                nearest_vert = self.tree.get_nearest_state(s)
-                nearest_vert_idx = nearest_vert[0]
-
-                # Partial extensions, if enabled
-                if self.ext_mode == 'E2':
-                    s, goal_added = self.extend(nearest_vert[1], s) # s = x_new
-                    if not env.state_validity_checker(s):
+        samples = self.sampler.iterate()
+        goal_added = False; num_iter = 0; self.goal_idx = None
+        self.vertex_steps = {}; self.vertex_domains = {}
+        num_failed_extensions = 0; num_rejected_samples = 0
+        try:
+            while not goal_added:
+                if max_iter is not None and num_iter >= max_iter:
+                    break
+                if delta_interval is not None and num_iter > 0 and num_iter % delta_interval == 0:
+                    yield self.get_tree_delta(num_iter, np.inf)
+                num_iter += 1
+
+                # Samples (goal-biased) are drawn and validity-checked in batches
+                with self.profile.phase('sampling'):
+                    s, goal, is_valid = next(samples)
+
+                # Is the sample in the free space?
+                if is_valid:
+                    with self.profile.phase('nearest_neighbor'):
+                        nearest_vert = self.tree.get_nearest_state(s)
+                    nearest_vert_idx = nearest_vert[0]
+
+                    # Dynamic domain: samples beyond the domain radius of their nearest vertex are rejected
+                    if self.adaptive and not self.is_in_domain(nearest_vert_idx, nearest_vert[1], s):
+                        num_rejected_samples += 1
                         continue
-            
-                # Does the edge between the sample and its nearest tree node collide with any obstacles?
-                if env.edge_validity_checker(s, nearest_vert[1]):
-                    s_idx = self.tree.add_vertex(s, nearest_vert)
-                    cost = env.compute_distance(s, nearest_vert[1])
-                    self.tree.add_edge(nearest_vert_idx,s_idx,cost)
-                    if goal == True and self.ext_mode == 'E1':
-                        goal_added = True
-                else:
-                    goal_added = False
-
-        if goal_added:
-            plan.append(s)
-            child_idx = s_idx
-            parent_state = nearest_vert[1]
-            while self.tree.edges[child_idx]:
-                plan.append(parent_state)
-                child_idx = self.tree.get_idx_for_state(parent_state)
-                # new parent
-                parent_idx = self.tree.edges[child_idx] 
-                parent_state = self.tree.vertices[parent_idx].state
-            plan.append(parent_state)
-        plan = plan[::-1]
-    
-        print(f"Total number of iterations needed to reach goal: {num_iter}")
-
-        total_time = time.time()-start_time
-        total_cost = self.compute_cost(plan)
-        print('Total cost of path: {:.3f}'.format(total_cost))
-        print('Total time: {:.3f} seconds'.format(total_time))
-
-        UpdateTable = False
-        if UpdateTable:
-            if env.start[0] == 10:
-                map = 'M1'
-            elif env.start[0] == 250:
-                map = 'M2'
-            else:
-                map = 'Unknown'
-
-            #update_table(planner='rrt', map=map, ext_mode=self.ext_mode, goal_bias=self.goal_prob, step_size=self.step_size,
-            #    num_iter=num_iter, time=total_time, cost=total_cost)
-        return np.array(plan)
+
+                    # Partial extensions, if enabled
+                    if self.ext_mode == 'E2':
+                        step_size = self.get_step_size(nearest_vert_idx, nearest_vert[1]) if self.adaptive else self.step_size
+                        s, goal_added = self.extend(nearest_vert[1], s, step_size) # s = x_new
+                        if s is None:
+                            num_failed_extensions += 1
+                            continue
+                        if not env.state_validity_checker(s):
+                            num_failed_extensions += 1
+                            if self.adaptive:
+                                self.update_vertex(nearest_vert_idx, step_size, success=False)
+                            continue
+                
+                    # Does the edge between the sample and its nearest tree node collide with any obstacles?
+                    if env.edge_validity_checker(s, nearest_vert[1]):
+                        s_idx = self.tree.add_vertex(s)
+                        cost = env.compute_distance(s, nearest_vert[1])
+                        self.tree.add_edge(nearest_vert_idx,s_idx,cost)
+                        if self.adaptive:
+                            self.update_vertex(nearest_vert_idx, step_size, success=True, new_idx=s_idx)
+                        if goal == True and self.ext_mode == 'E1':
+                            goal_added = True
+                    else:
+                        goal_added = False
+                        num_failed_extensions += 1
+                        if self.adaptive:
+                            self.update_vertex(nearest_vert_idx, step_size, success=False)
+
+            if goal_added:
+                self.goal_idx = s_idx
+        finally:
+            total_time = time.time()-start_time
+            total_cost = self.tree.get_cost(self.goal_idx) if self.goal_idx is not None else np.inf
+            self.stats = {'num_iter': num_iter, 'cost': float(total_cost), 'time': total_time, 'num_vertices': self.tree.get_num_vertices(),
+                          'num_failed_extensions': num_failed_extensions, 'num_rejected_samples': num_rejected_samples}
+            self.profile.set_totals(self.stats)
+
+    def get_plan(self):
+        '''
+        Return the plan to the goal vertex found by the last run (an empty array if the goal was not reached).
+        '''
+        if self.goal_idx is None:
+            return np.array([])
+        return np.array(self.tree.get_path_to_root(self.goal_idx))
+
+    def get_tree_delta(self, num_iter, cost, plan=None):
+        '''
+        Collect the changes to the tree since the last delta, together with the iteration number and the current solution cost.
+        @param num_iter The current iteration.
+        @param cost The cost of the solution so far (inf if there is none).
+        @param plan The final plan (only given for the last delta of the run).
+        '''
+        delta = self.tree.pop_delta()
+        delta.update({'iteration': num_iter, 'cost': float(cost), 'done': plan is not None,
+                      'plan': np.asarray(plan if plan is not None else [], dtype=float).reshape(-1, len(self.planning_env.start))})
+        return delta
 
     def compute_cost(self, plan):
         '''
         Compute and return the plan cost, which is the sum of the distances between steps.
         @param plan A given plan for the robot.
         '''
-        return self.tree.get_vertex_for_state(plan[-1]).cost
+        return self.tree.get_cost(self.tree.get_idx_for_state(plan[-1]))
 
-    def extend(self, near_state, rand_state):
+    def get_step_size(self, vid, state):
+        '''
+        Return the length of an adaptive extension from the given vertex: the step length learned from the extensions that reached
+        it, or the clearance around it (if the map has a raster) when that is longer, but never shorter than the base step size.
+        @param vid The ID of the vertex.
+        @param state The state of the vertex.
+        '''
+        step_size = self.vertex_steps.get(vid, self.step_size)
+        if self.use_clearance:
+            # a segment shorter than the clearance around its source cannot collide, so it is safe to step that far
+            clearance = float(self.planning_env.get_clearance_bound_xy(state[0], state[1]))
+            step_size = min(max(step_size, clearance), self.max_step_size)
+        return step_size
+
+    def is_in_domain(self, vid, state, sample):
+        '''
+        Check if a sample is within the dynamic domain of its nearest vertex (which is unbounded until an extension from it fails).
+        @param vid The ID of the nearest vertex.
+        @param state The state of the nearest vertex.
+        @param sample The sampled state.
         '''
-        Compute and return a new position for the sampled one.
+        radius = self.vertex_domains.get(vid)
+        return radius is None or self.planning_env.compute_distance(state, sample) <= radius
+
+    def update_vertex(self, vid, step_size, success, new_idx=None):
+        '''
+        Update the step length and domain radius of a vertex after an extension from it: a successful extension grows both
+        (and the new vertex starts with the grown step as well), while a failed one shrinks both, and bounds the domain of the vertex.
+        @param vid The ID of the vertex that was extended.
+        @param step_size The length of the extension.
+        @param success True if the extension added a new vertex.
+        @param new_idx The ID of the new vertex (if the extension succeeded).
+        '''
+        radius = self.vertex_domains.get(vid)
+        if success:
+            self.vertex_steps[vid] = self.vertex_steps[new_idx] = min(2 * step_size, self.max_step_size)
+            if radius is not None:
+                self.vertex_domains[vid] = radius * 1.1
+        else:
+            self.vertex_steps[vid] = max(step_size / 2, self.step_size)
+            self.vertex_domains[vid] = self.domain_radius if radius is None else max(radius * 0.9, self.step_size)
+
+    def extend(self, near_state, rand_state, step_size=None):
+        '''
+        Compute and return a new position for the sampled one (None if the sample is at the nearest position, so there is no extension).
         @param near_state The nearest position to the sampled position.
         @param rand_state The sampled position.
+        @param step_size The length of the extension (the planner's step size by default).
         '''
+        if step_size is None:
+            step_size = self.step_size
+        # N-dimensional states are steered along the shortest (wrapped) difference, under the environment's distance
+        space = self.planning_env.state_space
+        if space is not None:
+            new_state, dist = space.steer(near_state, rand_state, step_size)
+            if dist == 0:
+                return None, False
+            return new_state, dist <= step_size and np.array_equal(rand_state, self.planning_env.goal)
+
         goal = False
         goal_state = self.planning_env.goal
         if (rand_state[0]==goal_state[0] and rand_state[1]==goal_state[1]):
@@ -118,14 +246,19 @@ class RRTPlanner(object):
 
         vec = [rand_state[i]-near_state[i] for i in range(2)]
         vec_mag = np.sqrt(sum(j**2 for j in vec))
+        if vec_mag == 0:
+            return None, False
+        # adaptive extensions can be much longer than the base step, so they stop at the sample instead of overshooting it
+        if self.adaptive and vec_mag <= step_size:
+            return np.array(rand_state), goal
         unit_vec = vec / vec_mag
-        new_vec = self.step_size * unit_vec
+        new_vec = step_size * unit_vec
         new_state = near_state + new_vec
 
         # check if this intersects the goal or not
         goal_added = False
         if goal:
-            if vec_mag < self.step_size:
+            if vec_mag < step_size:
                 new_state = rand_state
                 goal_added = True
         return new_state, goal_added
\ No newline at end of file
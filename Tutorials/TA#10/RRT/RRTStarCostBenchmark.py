@@ -0,0 +1,57 @@
+# This code was written by Yotam Granov
+
+# Compares the legacy RRT* (k-nearest rewiring without cost propagation) with the proper RRT* mode
+# (shrinking-radius rewiring with cost propagation), by the number of iterations needed to reach a target path cost.
+# Run from the TA#10 directory: python -m RRT.RRTStarCostBenchmark --map RRT/map1.json
+
+import os, io, argparse, contextlib
+import numpy as np
+from RRT.MapEnvironment import MapEnvironment
+from RRT.RRTStarPlanner import RRTStarPlanner
+
+MODES = {
+    'legacy k=5': dict(k=5, neighborhood='knn', propagate_costs=False),
+    'legacy log': dict(k=0, neighborhood='knn', propagate_costs=False),
+    'proper radius': dict(k=0, neighborhood='radius', propagate_costs=True),
+}
+
+def run(planning_env, mode, seed, args, target_cost=None):
+    '''
+    Run a single RRT* instance quietly, and return its statistics and the length of its plan.
+    '''
+    planner = RRTStarPlanner(planning_env=planning_env, ext_mode=args.ext_mode, goal_prob=args.goal_prob, seed=seed, lazy=True, **MODES[mode])
+    with contextlib.redirect_stdout(io.StringIO()):
+        plan = planner.plan(target_cost=target_cost, max_iter=args.max_iter)
+    length = planner.compute_path_length(plan) if len(plan) > 0 else np.inf
+    return planner.stats, length
+
+def main():
+    parser = argparse.ArgumentParser(description='Iterations-to-target-cost benchmark for RRT* modes.')
+    parser.add_argument('--map', default='RRT/map1.json')
+    parser.add_argument('--ext-mode', default='E2', choices=['E1', 'E2'])
+    parser.add_argument('--goal-prob', type=float, default=0.05)
+    parser.add_argument('--seeds', type=int, default=10)
+    parser.add_argument('--max-iter', type=int, default=20000)
+    parser.add_argument('--target-cost', type=float, default=None, help='defaults to target-ratio times the median first-solution cost')
+    parser.add_argument('--target-ratio', type=float, default=0.95)
+    args = parser.parse_args()
+
+    planning_env = MapEnvironment(json_file=args.map, headless=True)
+
+    # calibrate the target cost from the first solutions, if not given
+    target_cost = args.target_cost
+    if target_cost is None:
+        first_costs = [run(planning_env, mode, seed, args)[1] for mode in MODES for seed in range(args.seeds)]
+        target_cost = args.target_ratio * np.median(first_costs)
+    print('Target cost: {:.3f}'.format(target_cost))
+
+    print('{:<15} {:>9} {:>14} {:>14} {:>11}'.format('mode', 'success', 'median iters', 'median cost', 'median time'))
+    for mode in MODES:
+        results = [run(planning_env, mode, seed, args, target_cost=target_cost) for seed in range(args.seeds)]
+        success = [r for r in results if r[1] <= target_cost]
+        iters = np.median([r[0]['num_iter'] for r in success]) if success else np.nan
+        print('{:<15} {:>8.0%} {:>14.0f} {:>14.3f} {:>10.2f}s'.format(mode, len(success)/len(results), iters,
+            np.median([r[1] for r in results]), np.median([r[0]['time'] for r in results])))
+
+if __name__ == '__main__':
+    main()
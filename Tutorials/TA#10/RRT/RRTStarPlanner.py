@@ -2,143 +2,448 @@
 
 import numpy as np
 from RRT.RRTTree import RRTTree
+from RRT.RRTArrayTree import RRTArrayTree
+from RRT.BatchSampler import BatchSampler
+from RRT.PlannerStats import PlannerStats, InstrumentedEnvironment
 import time
 
 class RRTStarPlanner(object):
-    def __init__(self, planning_env, ext_mode, goal_prob, k):
-        # set environment and search tree
+    def __init__(self, planning_env, ext_mode, goal_prob, k, use_spatial_index=True, tree_backend='dict', seed=None, batch_size=256, lazy=False,
+                 neighborhood='knn', gamma=None, propagate_costs=None, informed=False, prune_interval=100,
+                 instrument=False, trace=False, sequence='uniform'):
+        # set environment and search tree (when instrumented, the environment's collision checks are timed per phase)
+        self.profile = PlannerStats(enabled=instrument, trace=trace)
+        if self.profile.enabled:
+            planning_env = InstrumentedEnvironment(planning_env, self.profile)
         self.planning_env = planning_env
-        self.tree = RRTTree(self.planning_env)
+        if tree_backend == 'dict':
+            self.tree = RRTTree(self.planning_env, use_spatial_index=use_spatial_index)
+        elif tree_backend == 'array':
+            self.tree = RRTArrayTree(self.planning_env, use_spatial_index=use_spatial_index)
+        else:
+            raise ValueError('Unknown tree backend: {}'.format(tree_backend))
 
         # set search params
         self.ext_mode = ext_mode
         self.goal_prob = goal_prob
+        self.sampler = BatchSampler(planning_env, goal_prob, seed=seed, batch_size=batch_size, sequence=sequence)
         self.k = k
+        self.log_k = (k == 0)
+        self.lazy = lazy
+
+        # neighborhood for rewiring, either 'knn' (fixed k, or 2*log10(n) if k=0) or 'radius' (shrinking RRT* radius)
+        self.neighborhood = neighborhood
+        if self.neighborhood not in ('knn', 'radius'):
+            raise ValueError('Unknown neighborhood: {}'.format(neighborhood))
+        self.dim = len(planning_env.start)
+        space = planning_env.state_space
+        if gamma is None:
+            # gamma must exceed 2*(1+1/d)^(1/d)*(free space volume/unit ball volume)^(1/d) for asymptotic optimality
+            if space is not None:
+                # (the volume of the whole space bounds the free space volume)
+                gamma = 1.1 * 2 * (1 + 1/self.dim)**(1/self.dim) * (space.get_volume() / space.get_unit_ball_volume())**(1/self.dim)
+            else:
+                gamma = 1.1 * 2 * (1 + 1/2)**(1/2) * (planning_env.get_free_space_area() / np.pi)**(1/2)
+        self.gamma = gamma
+
+        # propagate cost changes to the descendants of rewired vertices (on by default in radius and informed modes)
+        if propagate_costs is None:
+            propagate_costs = (self.neighborhood == 'radius' or informed)
+        self.propagate_costs = propagate_costs
+
+        # informed RRT*: once a solution exists, sample from the informed ellipse and periodically prune the tree
+        # (pruning relies on exact costs-to-come, so it only runs when costs are propagated)
+        if informed and space is not None:
+            raise ValueError('Informed sampling is only supported for planar states')
+        self.informed = informed
+        self.prune_interval = prune_interval
+        self.stats = {}
 
-        # set step size for extensions
-        if planning_env.ylimit[1] < 100:
+        # set step size for extensions (N-dimensional spaces set their own, in the units of their distance)
+        if planning_env.state_space is not None:
+            self.step_size = planning_env.state_space.step_size
+        elif planning_env.ylimit[1] < 100:
             self.step_size = 0.2
         else:
             self.step_size = 10
 
-    def plan(self):
+    def plan(self, target_cost=None, max_iter=None, time_budget=None, callback=None, return_stats=False):
         '''
         Compute and return the plan. The function should return a numpy array containing the states (positions) of the robot.
+        By default the planner stops at the first solution. If a time budget is given it runs in anytime mode, and keeps improving
+        the solution until the budget expires, returning the best plan found.
+        @param target_cost If given, keep improving the solution after the goal is reached, until its path length is at most this cost.
+        @param max_iter If given, stop after this number of iterations (and return an empty plan if the goal was not reached).
+        @param time_budget If given, the wall-clock budget (in seconds) for the whole run.
+        @param callback If given, called as callback(plan, cost, timestamp) for each improved plan, where timestamp is the time since the run started.
+        @param return_stats If True, return the PlannerStats of the run (per-phase times and calls, if instrumented) along with the plan.
+        '''
+        plan = []
+        for plan, cost, timestamp in self.iterate_solutions(target_cost=target_cost, max_iter=max_iter, time_budget=time_budget, anytime=time_budget is not None):
+            if callback is not None:
+                callback(plan, cost, timestamp)
+
+        print(f"Total number of iterations needed to reach goal: {self.stats['num_iter']}")
+        print(f"Total number of rewirings conducted: {self.stats['num_rewires']}")
+        if self.lazy:
+            print(f"Total number of edge checks avoided by lazy rewiring: {self.stats['num_avoided_checks']}")
+
+        # print total path cost and time
+        print('Total cost of path: {:.3f}'.format(self.stats['cost']))
+        print('Total time: {:.3f} seconds'.format(self.stats['time']))
+        if return_stats:
+            return np.array(plan), self.profile
+        return np.array(plan)
+
+    def plan_anytime(self, time_budget=None, iter_budget=None, target_cost=None):
+        '''
+        Anytime RRT*: a generator which yields (plan, cost, timestamp) for the first solution and for every improvement
+        of it, and keeps sampling and rewiring until the time or iteration budget expires (or the target cost is reached).
+        @param time_budget The wall-clock budget (in seconds) for the whole run.
+        @param iter_budget The maximal number of iterations.
+        @param target_cost If given, stop once the path length is at most this cost.
+        '''
+        if time_budget is None and iter_budget is None and target_cost is None:
+            raise ValueError('Anytime planning requires a time budget, an iteration budget or a target cost')
+        yield from self.iterate_solutions(target_cost=target_cost, max_iter=iter_budget, time_budget=time_budget, anytime=True)
+
+    def plan_deltas(self, delta_interval=100, target_cost=None, max_iter=None, time_budget=None, anytime=False):
+        '''
+        A generator which runs the planner and yields the changes to the tree (see RRTTree.pop_delta) every delta_interval iterations,
+        e.g. for progressive visualization or for appending to a TreeDeltaLog. Each delta also holds the iteration number and the
+        cost of the solution so far. The last delta is marked as done, and holds the plan. The stopping conditions are as in plan.
+        @param delta_interval The number of iterations between deltas.
+        @param target_cost If given, keep improving the solution until its path length is at most this cost.
+        @param max_iter If given, stop after this number of iterations.
+        @param time_budget If given, the wall-clock budget (in seconds) for the whole run.
+        @param anytime If True, keep improving the solution until a budget expires.
+        '''
+        self.tree.start_delta_log()
+        for kind, event in self.iterate_events(target_cost, max_iter, time_budget, anytime, delta_interval=delta_interval):
+            if kind == 'delta':
+                yield event
+        yield self.get_tree_delta(self.stats['num_iter'], self.stats['cost'], plan=self.best_plan)
+
+    def iterate_solutions(self, target_cost, max_iter, time_budget, anytime):
+        '''
+        Run the planning loop, yielding (plan, cost, timestamp) whenever the path to the goal improves. The statistics of the run
+        are stored in self.stats once the loop ends.
+        @param target_cost Stop once the path length is at most this cost (None for no target).
+        @param max_iter Stop after this number of iterations (None for no limit).
+        @param time_budget Stop after this number of seconds (None for no limit).
+        @param anytime If False, stop at the first solution.
+        '''
+        for kind, event in self.iterate_events(target_cost, max_iter, time_budget, anytime):
+            if kind == 'solution':
+                yield event
+
+    def iterate_events(self, target_cost, max_iter, time_budget, anytime, delta_interval=None):
+        '''
+        The planning loop. A generator of ('solution', (plan, cost, timestamp)) events whenever the path to the goal improves,
+        and of ('delta', tree delta) events every delta_interval iterations (if given).
+        @param target_cost Stop once the path length is at most this cost (None for no target).
+        @param max_iter Stop after this number of iterations (None for no limit).
+        @param time_budget Stop after this number of seconds (None for no limit).
+        @param anytime If False, stop at the first solution.
+        @param delta_interval If given, the number of iterations between tree deltas.
         '''
         start_time = time.time()
+        deadline = start_time + time_budget if time_budget is not None else None
+        self.profile.reset()
         
         env = self.planning_env
         self.tree.add_vertex(env.start)
 
-        log = False
-        if self.k == 0: # log mode
-            log = True
+        samples = self.sampler.iterate()
+        self.stats = {'num_rewires': 0, 'num_rewire_checks': 0, 'num_avoided_checks': 0, 'first_solution_iter': None, 'num_improvements': 0, 'num_pruned': 0,
+                      'num_failed_extensions': 0}
+        goal_idx = None; num_iter = 0; best_cost = np.inf; pruned_cost = np.inf
+        self.goal_path_length = None; self.best_plan = np.array([])
+        try:
+            while not self.is_done(goal_idx, num_iter, target_cost, max_iter, deadline, anytime):
+                if delta_interval is not None and num_iter > 0 and num_iter % delta_interval == 0:
+                    yield 'delta', self.get_tree_delta(num_iter, best_cost)
+                num_iter += 1
+                with self.profile.phase('sampling'):
+                    sample = next(samples)
+                goal_idx = self.run_iteration(sample, goal_idx)
+                if goal_idx is None:
+                    continue
+                if self.stats['first_solution_iter'] is None:
+                    self.stats['first_solution_iter'] = num_iter
 
-        goal_added = False; num_iter = 0; num_rewires = 0; plan = []
-        while not goal_added:
-            num_iter += 1
-            goal = False; 
+                # report the solution whenever its path length improves
+                cost = self.get_goal_path_length(goal_idx)
+                if cost < best_cost:
+                    best_cost = cost
+                    self.best_plan = np.array(self.tree.get_path_to_root(goal_idx))
+                    self.stats['num_improvements'] += 1
+                    if self.informed:
+                        self.sampler.set_cost_bound(best_cost)
+                    yield 'solution', (self.best_plan, cost, time.time()-start_time)
 
-            # Here we manually add goal biasing
-            p = np.random.uniform()
-            if p < self.goal_prob:
-                s = env.goal
-                goal = True
-            else:
-                x = np.random.uniform(env.xlimit[0], env.xlimit[1])
-                y = np.random.uniform(env.ylimit[0], env.ylimit[1])
-                s = [x,y]
-
-            # Is the sample in the free space?
-            if env.state_validity_checker(s):
-                nearest_vert = self.tree.get_nearest_state(s)
-                nearest_vert_idx = nearest_vert[0]
-
-                # Partial extensions, if enabled
-                if self.ext_mode == 'E2':
-                    s, goal_added = self.extend(nearest_vert[1], s) # s = x_new
-                    if not env.state_validity_checker(s):
-                        continue
-                
-                # Does the edge between the sample and its nearest tree node collide with any obstacles?
-                if env.edge_validity_checker(s, nearest_vert[1]):
-                    s_idx = self.tree.add_vertex(s, nearest_vert)
-                    cost = env.compute_distance(s, nearest_vert[1])
-                    self.tree.add_edge(nearest_vert_idx,s_idx,cost)
-                    if goal == True and self.ext_mode == 'E1':
-                        goal_added = True
-                    if log == True:
-                        self.k = int(2*np.log10(len(self.tree.vertices)))
-                    # rewiring phase
-                    if len(self.tree.vertices) > self.k:
-                        knn_idxs, knn_states = self.tree.get_k_nearest_neighbors(s, self.k)
-                        for i in range(len(knn_states)):
-                            if knn_idxs[i] == s_idx:
-                                continue
-                            if env.edge_validity_checker(knn_states[i],s):
-                                old_cost = self.tree.vertices[s_idx].cost
-                                # calculating the potential new cost for the sample
-                                c = env.compute_distance(knn_states[i],s)
-                                potential_parent_cost = self.tree.vertices[knn_idxs[i]].cost
-                                potential_new_cost = potential_parent_cost + c
-                                # checking for improvement
-                                if potential_new_cost < old_cost:
-                                    self.tree.vertices[s_idx].cost = potential_new_cost
-                                    self.tree.edges[s_idx] = knn_idxs[i]
-                                    num_rewires += 1
-                        for i in range(len(knn_states)):
-                            if knn_idxs[i] == s_idx:
-                                continue
-                            if env.edge_validity_checker(s,knn_states[i]):
-                                old_cost = self.tree.vertices[knn_idxs[i]].cost
-                                # calculating the potential new cost for the neighbors
-                                c = env.compute_distance(s,knn_states[i])
-                                potential_parent_cost = self.tree.vertices[s_idx].cost
-                                potential_new_cost = potential_parent_cost + c
-                                # checking for improvement
-                                if potential_new_cost < old_cost:
-                                    self.tree.vertices[knn_idxs[i]].cost = potential_new_cost
-                                    self.tree.edges[knn_idxs[i]] = s_idx
-                                    num_rewires += 1
-                else:
-                    goal_added = False
-                    
-        if goal_added:
-            plan.append(s)
-            child_idx = s_idx
-            parent_state = nearest_vert[1]
-            while self.tree.edges[child_idx]:
-                plan.append(parent_state)
-                child_idx = self.tree.get_idx_for_state(parent_state)
-                # new parent
-                parent_idx = self.tree.edges[child_idx] 
-                parent_state = self.tree.vertices[parent_idx].state
-            plan.append(parent_state)
-        plan = plan[::-1]
-
-        print(f"Total number of iterations needed to reach goal: {num_iter}")
-        print(f"Total number of rewirings conducted: {num_rewires}")
+                # branch-and-bound pruning of the vertices that cannot improve the solution
+                if self.informed and self.propagate_costs and num_iter % self.prune_interval == 0 and best_cost < pruned_cost:
+                    with self.profile.phase('pruning'):
+                        self.stats['num_pruned'] += self.prune(best_cost)
+                    pruned_cost = best_cost
+        finally:
+            # also reached when the caller stops consuming the solutions early
+            self.goal_idx = goal_idx
+            total_time = time.time()-start_time
+            # the length of the best (returned) plan, as the costs stored in the tree are stale after rewiring (unless propagated)
+            total_cost = best_cost
+            self.stats.update({'num_iter': num_iter, 'cost': float(total_cost), 'time': total_time, 'num_vertices': self.tree.get_num_vertices()})
+            self.profile.set_totals(self.stats)
 
-        # print total path cost and time
-        total_time = time.time()-start_time
-        total_cost = self.compute_cost(plan)
-        print('Total cost of path: {:.3f}'.format(total_cost))
-        print('Total time: {:.3f} seconds'.format(total_time))        
-        return np.array(plan)
+    def get_tree_delta(self, num_iter, cost, plan=None):
+        '''
+        Collect the changes to the tree since the last delta, together with the iteration number and the current solution cost.
+        @param num_iter The current iteration.
+        @param cost The cost of the solution so far (inf if there is none).
+        @param plan The final plan (only given for the last delta of the run).
+        '''
+        delta = self.tree.pop_delta()
+        delta.update({'iteration': num_iter, 'cost': float(cost), 'done': plan is not None,
+                      'plan': np.asarray(plan if plan is not None else [], dtype=float).reshape(-1, len(self.planning_env.start))})
+        return delta
+
+    def run_iteration(self, sample, goal_idx):
+        '''
+        Run a single RRT* iteration: extend the tree towards the sample and rewire around the new vertex.
+        Returns the ID of the goal vertex (None if the goal is not in the tree yet).
+        @param sample A (state, is_goal, is_valid) tuple from the sampler.
+        @param goal_idx The ID of the goal vertex (None if the goal is not in the tree yet).
+        '''
+        env = self.planning_env
+        s, goal, is_valid = sample
+
+        # Is the sample in the free space?
+        if not is_valid:
+            return goal_idx
+        with self.profile.phase('nearest_neighbor'):
+            nearest_vert = self.tree.get_nearest_state(s)
+        nearest_vert_idx = nearest_vert[0]
+
+        # Partial extensions, if enabled
+        goal_added = goal and self.ext_mode == 'E1'
+        if self.ext_mode == 'E2':
+            s, goal_added = self.extend(nearest_vert[1], s) # s = x_new
+            if s is None or not env.state_validity_checker(s):
+                self.stats['num_failed_extensions'] += 1
+                return goal_idx
+
+        # Once the goal is in the tree, its cost is only improved by rewiring
+        if goal_added and goal_idx is not None:
+            return goal_idx
+
+        # Does the edge between the sample and its nearest tree node collide with any obstacles?
+        if env.edge_validity_checker(s, nearest_vert[1]):
+            s_idx = self.tree.add_vertex(s)
+            cost = env.compute_distance(s, nearest_vert[1])
+            self.tree.add_edge(nearest_vert_idx,s_idx,cost)
+            if goal_added:
+                goal_idx = s_idx
+
+            # rewiring phase
+            with self.profile.phase('neighbor_search'):
+                knn_idxs, knn_states = self.get_neighbors(s)
+            if len(knn_idxs) > 0:
+                with self.profile.phase('rewiring'):
+                    if self.lazy:
+                        self.rewire_lazy(s_idx, s, knn_idxs, knn_states, nearest_vert_idx)
+                    else:
+                        self.rewire(s_idx, s, knn_idxs, knn_states)
+        else:
+            self.stats['num_failed_extensions'] += 1
+        return goal_idx
+
+    def is_done(self, goal_idx, num_iter, target_cost, max_iter, deadline, anytime):
+        '''
+        Check the stopping condition of the planning loop.
+        @param goal_idx The ID of the goal vertex (None if not reached yet).
+        @param num_iter The number of iterations so far.
+        @param target_cost The requested path length (None for no target).
+        @param max_iter The maximal number of iterations (None for no limit).
+        @param deadline The wall-clock time at which to stop (None for no limit).
+        @param anytime If False, stop at the first solution.
+        '''
+        if max_iter is not None and num_iter >= max_iter:
+            return True
+        if deadline is not None and time.time() >= deadline:
+            return True
+        if goal_idx is None:
+            return False
+        if target_cost is not None:
+            return self.get_goal_path_length(goal_idx) <= target_cost
+        return not anytime
+
+    def get_goal_path_length(self, goal_idx):
+        '''
+        Return the length of the current path to the goal.
+        @param goal_idx The ID of the goal vertex.
+        '''
+        # the path to the goal can only change when vertices are rewired
+        if self.goal_path_length is None or self.goal_path_length[0] != self.stats['num_rewires']:
+            self.goal_path_length = (self.stats['num_rewires'], self.compute_path_length(self.tree.get_path_to_root(goal_idx)))
+        return self.goal_path_length[1]
+
+    def prune(self, best_cost):
+        '''
+        Remove the vertices whose cost-to-come plus the straight-line distance to the goal exceeds the best solution cost,
+        together with their subtrees. Returns the number of removed vertices.
+        @param best_cost The cost of the best solution so far.
+        '''
+        env = self.planning_env
+        to_prune = [vid for vid in self.tree.get_vertex_ids()
+                    if self.tree.get_cost(vid) + env.compute_distance(self.tree.get_state(vid), env.goal) > best_cost * (1 + 1e-9)]
+        pruned = set(to_prune)
+
+        # removing the topmost pruned vertices also removes their descendants
+        num_removed = 0
+        for vid in to_prune:
+            if self.tree.has_vertex(vid) and self.tree.get_parent(vid) not in pruned:
+                num_removed += self.tree.remove_subtree(vid)
+        return num_removed
+
+    def get_neighbors(self, s):
+        '''
+        Return the IDs and states of the vertices to consider for rewiring around a new state.
+        @param s The new state (already in the tree).
+        '''
+        n = self.tree.get_num_vertices()
+        if self.neighborhood == 'radius':
+            # shrinking RRT* radius
+            radius = self.gamma * (np.log(n) / n)**(1/self.dim) if n > 1 else 0
+            return self.tree.get_neighbors_within_radius(s, radius)
+
+        if self.log_k: # log mode
+            self.k = int(2*np.log10(n))
+        if n > self.k:
+            return self.tree.get_k_nearest_neighbors(s, self.k)
+        return [], []
+
+    def compute_path_length(self, plan):
+        '''
+        Compute and return the length of a plan, by summing the distances between its steps (this does not rely on the costs stored in the tree).
+        @param plan A given plan for the robot.
+        '''
+        return sum(self.planning_env.compute_distance(plan[i], plan[i+1]) for i in range(len(plan)-1))
+
+    def rewire(self, s_idx, s, knn_idxs, knn_states):
+        '''
+        Choose the best parent for the new vertex among its neighbors, and then rewire the neighbors through it if this improves their cost.
+        @param s_idx The ID of the new vertex.
+        @param s The state of the new vertex.
+        @param knn_idxs The IDs of the neighbors.
+        @param knn_states The states of the neighbors.
+        '''
+        env = self.planning_env
+        for i in range(len(knn_states)):
+            if knn_idxs[i] == s_idx:
+                continue
+            self.stats['num_rewire_checks'] += 1
+            if env.edge_validity_checker(knn_states[i],s):
+                old_cost = self.tree.get_cost(s_idx)
+                # calculating the potential new cost for the sample
+                c = env.compute_distance(knn_states[i],s)
+                potential_parent_cost = self.tree.get_cost(knn_idxs[i])
+                potential_new_cost = potential_parent_cost + c
+                # checking for improvement
+                if potential_new_cost < old_cost:
+                    self.tree.set_cost(s_idx, potential_new_cost)
+                    self.tree.set_parent(s_idx, knn_idxs[i])
+                    self.stats['num_rewires'] += 1
+        for i in range(len(knn_states)):
+            if knn_idxs[i] == s_idx:
+                continue
+            self.stats['num_rewire_checks'] += 1
+            if env.edge_validity_checker(s,knn_states[i]):
+                old_cost = self.tree.get_cost(knn_idxs[i])
+                # calculating the potential new cost for the neighbors
+                c = env.compute_distance(s,knn_states[i])
+                potential_parent_cost = self.tree.get_cost(s_idx)
+                potential_new_cost = potential_parent_cost + c
+                # checking for improvement
+                if potential_new_cost < old_cost:
+                    self.set_neighbor_cost(knn_idxs[i], potential_new_cost)
+                    self.tree.set_parent(knn_idxs[i], s_idx)
+                    self.stats['num_rewires'] += 1
+
+    def rewire_lazy(self, s_idx, s, knn_idxs, knn_states, parent_idx):
+        '''
+        Same as rewire, but only collision-checks the edges that would actually improve a cost, in order of prospective cost,
+        and checks each undirected edge at most once.
+        @param s_idx The ID of the new vertex.
+        @param s The state of the new vertex.
+        @param knn_idxs The IDs of the neighbors.
+        @param knn_states The states of the neighbors.
+        @param parent_idx The ID of the current parent of the new vertex (its edge is known to be valid).
+        '''
+        env = self.planning_env
+        neighbors = [(knn_idxs[i], knn_states[i], env.compute_distance(knn_states[i], s)) for i in range(len(knn_states)) if knn_idxs[i] != s_idx]
+        edge_cache = {parent_idx: True}
+        def is_edge_valid(n_idx, n_state):
+            if n_idx not in edge_cache:
+                self.stats['num_rewire_checks'] += 1
+                edge_cache[n_idx] = env.edge_validity_checker(n_state, s)
+            return edge_cache[n_idx]
+
+        # choose the cheapest valid parent, candidates that cannot improve the cost are never checked
+        candidates = sorted(neighbors, key=lambda n: self.tree.get_cost(n[0]) + n[2])
+        for n_idx, n_state, c in candidates:
+            potential_new_cost = self.tree.get_cost(n_idx) + c
+            if potential_new_cost >= self.tree.get_cost(s_idx):
+                break
+            if is_edge_valid(n_idx, n_state):
+                self.tree.set_cost(s_idx, potential_new_cost)
+                self.tree.set_parent(s_idx, n_idx)
+                self.stats['num_rewires'] += 1
+                break
+
+        # rewire the neighbors whose cost would improve through the new vertex
+        for n_idx, n_state, c in neighbors:
+            potential_new_cost = self.tree.get_cost(s_idx) + c
+            if potential_new_cost < self.tree.get_cost(n_idx) and is_edge_valid(n_idx, n_state):
+                self.set_neighbor_cost(n_idx, potential_new_cost)
+                self.tree.set_parent(n_idx, s_idx)
+                self.stats['num_rewires'] += 1
+
+        # the eager rewiring checks every neighbor edge twice
+        self.stats['num_avoided_checks'] += 2 * len(neighbors) - len(edge_cache) + 1
+
+    def set_neighbor_cost(self, n_idx, cost):
+        '''
+        Set the new cost of a rewired neighbor, propagating it to its descendants if enabled.
+        @param n_idx The ID of the rewired neighbor.
+        @param cost The new cost of the neighbor.
+        '''
+        if self.propagate_costs:
+            self.tree.update_subtree_cost(n_idx, cost)
+        else:
+            self.tree.set_cost(n_idx, cost)
 
     def compute_cost(self, plan):
         '''
         Compute and return the plan cost, which is the sum of the distances between steps.
         @param plan A given plan for the robot.
         '''
-        return self.tree.get_vertex_for_state(plan[-1]).cost
+        return self.tree.get_cost(self.tree.get_idx_for_state(plan[-1]))
 
     def extend(self, near_state, rand_state):
         '''
-        Compute and return a new position for the sampled one.
+        Compute and return a new position for the sampled one (None if the sample is at the nearest position, so there is no extension).
         @param near_state The nearest position to the sampled position.
         @param rand_state The sampled position.
         '''
+        # N-dimensional states are steered along the shortest (wrapped) difference, under the environment's distance
+        space = self.planning_env.state_space
+        if space is not None:
+            new_state, dist = space.steer(near_state, rand_state, self.step_size)
+            if dist == 0:
+                return None, False
+            return new_state, dist <= self.step_size and np.array_equal(rand_state, self.planning_env.goal)
+
         goal = False
         goal_state = self.planning_env.goal
         if (rand_state[0]==goal_state[0] and rand_state[1]==goal_state[1]):
@@ -146,6 +451,8 @@ class RRTStarPlanner(object):
 
         vec = [rand_state[i]-near_state[i] for i in range(2)]
         vec_mag = np.sqrt(sum(j**2 for j in vec))
+        if vec_mag == 0:
+            return None, False
         unit_vec = vec / vec_mag
         new_vec = self.step_size * unit_vec
         new_state = near_state + new_vec
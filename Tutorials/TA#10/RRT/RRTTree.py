@@ -1,14 +1,31 @@
 # This code was written by Oren Salzman and Dean Zadok, and revised by Yotam Granov
 
-import operator
+import math, operator
 import numpy as np
+from RRT.GridIndex import GridIndex
 
 class RRTTree(object):
-    def __init__(self, planning_env, task="mp"):
+    def __init__(self, planning_env, task="mp", use_spatial_index=True):
         self.planning_env = planning_env
         self.task = task
         self.vertices = {}
         self.edges = {}
+        self.state_to_idx = {}
+        self.children = {}
+        self.next_vid = 0
+
+        # the longest edge ever added (edge costs are edge lengths), which bounds the box queries over the edges
+        self.max_edge_length = 0
+
+        # changes since the last tree delta (only tracked once start_delta_log is called)
+        self.delta_start, self.delta_rewired, self.delta_removed = None, None, None
+
+        # spatial index for nearest-neighbor queries (set use_spatial_index=False for the brute-force search)
+        # the grid index is planar, so the states of N-dimensional environments are always searched by brute force
+        self.use_spatial_index = use_spatial_index and planning_env.state_space is None
+        if self.use_spatial_index:
+            extent = max(planning_env.xlimit[1]-planning_env.xlimit[0], planning_env.ylimit[1]-planning_env.ylimit[0], 1)
+            self.spatial_index = GridIndex(cell_size=extent/16, min_cell_size=extent/4096)
 
     def get_root_id(self):
         '''
@@ -21,8 +38,12 @@ class RRTTree(object):
         Add a state to the tree.
         @param state state to add to the tree.
         '''
-        vid = len(self.vertices)
+        vid = self.next_vid
+        self.next_vid += 1
         self.vertices[vid] = RRTVertex(state=state, inspected_points=inspected_points)
+        self.state_to_idx.setdefault(self.get_state_key(state), vid)
+        if self.use_spatial_index:
+            self.spatial_index.insert(vid, state)
         return vid
 
     def add_edge(self, sid, eid, edge_cost):
@@ -32,7 +53,142 @@ class RRTTree(object):
         @param eid end state ID
         '''
         self.edges[eid] = sid
+        self.children.setdefault(sid, []).append(eid)
         self.vertices[eid].set_cost(cost=self.vertices[sid].cost + edge_cost)
+        self.max_edge_length = max(self.max_edge_length, edge_cost)
+
+    def get_num_vertices(self):
+        '''
+        Returns the number of vertices in the tree.
+        '''
+        return len(self.vertices)
+
+    def get_state(self, vid):
+        '''
+        Returns the state of a vertex.
+        @param vid The vertex ID.
+        '''
+        return self.vertices[vid].state
+
+    def get_cost(self, vid):
+        '''
+        Returns the cost-to-come of a vertex.
+        @param vid The vertex ID.
+        '''
+        return self.vertices[vid].cost
+
+    def set_cost(self, vid, cost):
+        '''
+        Sets the cost-to-come of a vertex.
+        @param vid The vertex ID.
+        @param cost The new cost.
+        '''
+        self.vertices[vid].set_cost(cost=cost)
+
+    def get_parent(self, vid):
+        '''
+        Returns the ID of the parent of a vertex (None for the root).
+        @param vid The vertex ID.
+        '''
+        return self.edges.get(vid)
+
+    def set_parent(self, vid, parent_id):
+        '''
+        Replaces the parent of a vertex, without changing its cost.
+        @param vid The vertex ID.
+        @param parent_id The ID of the new parent.
+        '''
+        if vid in self.edges:
+            self.children[self.edges[vid]].remove(vid)
+        self.edges[vid] = parent_id
+        self.children.setdefault(parent_id, []).append(vid)
+        self.max_edge_length = max(self.max_edge_length, self.planning_env.compute_distance(self.vertices[parent_id].state, self.vertices[vid].state))
+        if self.delta_rewired is not None:
+            self.delta_rewired.add(vid)
+
+    def get_children(self, vid):
+        '''
+        Returns the IDs of the children of a vertex.
+        @param vid The vertex ID.
+        '''
+        return self.children.get(vid, [])
+
+    def update_subtree_cost(self, vid, cost):
+        '''
+        Sets the cost-to-come of a vertex, and propagates the change in cost to all of its descendants.
+        @param vid The vertex ID.
+        @param cost The new cost.
+        '''
+        delta = cost - self.vertices[vid].cost
+        stack = [vid]
+        while stack:
+            u = stack.pop()
+            self.vertices[u].cost += delta
+            stack.extend(self.children.get(u, []))
+
+    def get_vertex_ids(self):
+        '''
+        Returns the IDs of all vertices in the tree.
+        '''
+        return list(self.vertices.keys())
+
+    def has_vertex(self, vid):
+        '''
+        Check if a vertex with the given ID is in the tree.
+        @param vid The vertex ID.
+        '''
+        return vid in self.vertices
+
+    def remove_subtree(self, vid):
+        '''
+        Removes a vertex and all of its descendants from the tree, and returns the number of removed vertices.
+        @param vid The ID of the root of the removed subtree.
+        '''
+        if vid in self.edges:
+            self.children[self.edges[vid]].remove(vid)
+        stack = [vid]; num_removed = 0
+        while stack:
+            u = stack.pop()
+            stack.extend(self.children.pop(u, []))
+            self.edges.pop(u, None)
+            if self.delta_removed is not None and u < self.delta_start:
+                self.delta_removed.add(u)
+            state_key = self.get_state_key(self.vertices[u].state)
+            if self.state_to_idx.get(state_key) == u:
+                del self.state_to_idx[state_key]
+            if self.use_spatial_index:
+                self.spatial_index.remove(u)
+            del self.vertices[u]
+            num_removed += 1
+        return num_removed
+
+    def start_delta_log(self):
+        '''
+        Start tracking the changes to the tree, to be collected by pop_delta.
+        '''
+        self.delta_start = self.next_vid
+        self.delta_rewired = set()
+        self.delta_removed = set()
+
+    def pop_delta(self):
+        '''
+        Return the changes to the tree since the last delta (or since start_delta_log): the IDs, states and parent IDs
+        of the new vertices, the IDs and new parent IDs of the rewired vertices, and the IDs of the removed vertices.
+        Parent IDs of -1 mark the root. Vertices both added and removed since the last delta are left out.
+        '''
+        new_ids = [vid for vid in range(self.delta_start, self.next_vid) if self.has_vertex(vid)]
+        rewired_ids = sorted(vid for vid in self.delta_rewired if vid < self.delta_start and self.has_vertex(vid))
+        get_parent_id = lambda vid: -1 if self.get_parent(vid) is None else self.get_parent(vid)
+        delta = {
+            'new_ids': np.array(new_ids, dtype=np.int64),
+            'new_states': np.array([self.get_state(vid) for vid in new_ids], dtype=float).reshape(len(new_ids), len(self.planning_env.start)),
+            'new_parents': np.array([get_parent_id(vid) for vid in new_ids], dtype=np.int64),
+            'rewired_ids': np.array(rewired_ids, dtype=np.int64),
+            'rewired_parents': np.array([get_parent_id(vid) for vid in rewired_ids], dtype=np.int64),
+            'removed_ids': np.array(sorted(self.delta_removed), dtype=np.int64),
+        }
+        self.start_delta_log()
+        return delta
 
     def is_goal_exists(self, state):
         '''
@@ -59,23 +215,44 @@ class RRTTree(object):
         Search for the vertex with the given state and return the index if exists
         @param state state to check if exists.
         '''
-        valid_idxs = [v_idx for v_idx, v in self.vertices.items() if (v.state[0] == state[0] and v.state[1] == state[1])]
-        if len(valid_idxs) > 0:
-            return valid_idxs[0]
-        return None
+        return self.state_to_idx.get(self.get_state_key(state))
+
+    def get_state_key(self, state):
+        '''
+        Return a hashable key for the given state, used to index the vertices by their states.
+        @param state The state to convert.
+        '''
+        if len(state) == 2:
+            return (float(state[0]), float(state[1]))
+        return tuple(float(x) for x in state)
+
+    def get_path_to_root(self, vid):
+        '''
+        Return the states along the tree branch from the root to the given vertex, by following the parent IDs.
+        @param vid The ID of the last vertex in the path.
+        '''
+        path = [self.vertices[vid].state]
+        while vid in self.edges:
+            vid = self.edges[vid]
+            path.append(self.vertices[vid].state)
+        return path[::-1]
 
     def get_nearest_state(self, state):
         '''
         Find the nearest vertex for the given state and returns its state index and state
         @param state Sampled state.
         '''
+        if self.use_spatial_index:
+            vid, _ = self.spatial_index.get_nearest(state)
+            return vid, self.vertices[vid].state
+
         # compute distances from all vertices
         dists = []
-        for _, vertex in self.vertices.items():
-            dists.append(self.planning_env.compute_distance(state, vertex.state))
+        for vid, vertex in self.vertices.items():
+            dists.append((vid, self.planning_env.compute_distance(state, vertex.state)))
 
         # retrieve the id of the nearest vertex
-        vid, _ = min(enumerate(dists), key=operator.itemgetter(1))
+        vid, _ = min(dists, key=operator.itemgetter(1))
         return vid, self.vertices[vid].state
 
     def get_k_nearest_neighbors(self, state, k):
@@ -84,13 +261,54 @@ class RRTTree(object):
         @param state Sampled state.
         @param k Number of nearest neighbors to retrieve.
         '''
-        dists = []
-        for _, vertex in self.vertices.items():
+        if self.use_spatial_index:
+            knn_ids, _ = self.spatial_index.get_k_nearest(state, k)
+            return knn_ids, [self.vertices[vid].state for vid in knn_ids]
+
+        vids, dists = [], []
+        for vid, vertex in self.vertices.items():
+            vids.append(vid)
             dists.append(self.planning_env.compute_distance(state, vertex.state))
 
         dists = np.array(dists)
-        knn_ids = np.argpartition(dists, k)[:k]
-        return knn_ids.tolist(), [self.vertices[vid].state for vid in knn_ids]
+        knn_ids = [vids[i] for i in np.argpartition(dists, k)[:k]]
+        return knn_ids, [self.vertices[vid].state for vid in knn_ids]
+
+    def get_neighbors_within_radius(self, state, radius):
+        '''
+        Return all neighbors within a given radius
+        @param state Sampled state.
+        @param radius The search radius.
+        '''
+        if self.use_spatial_index:
+            ids, _ = self.spatial_index.get_within_radius(state, radius)
+            return ids, [self.vertices[vid].state for vid in ids]
+
+        ids = [vid for vid, vertex in self.vertices.items() if self.planning_env.compute_distance(state, vertex.state) <= radius]
+        return ids, [self.vertices[vid].state for vid in ids]
+
+    def get_edges_in_box(self, bounds):
+        '''
+        Return the IDs of the vertices whose edges (to their parents) have bounding boxes overlapping the given box.
+        Both endpoints of such an edge are within the longest edge length of the box, so only the vertices around it are visited.
+        @param bounds The box, given as (min_x, min_y, max_x, max_y).
+        '''
+        min_x, min_y, max_x, max_y = bounds
+        if self.use_spatial_index:
+            center = ((min_x + max_x) / 2, (min_y + max_y) / 2)
+            radius = math.hypot(max_x - min_x, max_y - min_y) / 2 + self.max_edge_length
+            vids, _ = self.spatial_index.get_within_radius(center, radius)
+        else:
+            vids = list(self.edges.keys())
+
+        box_vids = []
+        for vid in vids:
+            if vid not in self.edges:
+                continue
+            (x1, y1), (x2, y2) = self.vertices[vid].state[:2], self.vertices[self.edges[vid]].state[:2]
+            if min(x1, x2) <= max_x and max(x1, x2) >= min_x and min(y1, y2) <= max_y and max(y1, y2) >= min_y:
+                box_vids.append(vid)
+        return box_vids
 
     def get_edges_as_states(self):
         '''
@@ -0,0 +1,76 @@
+# This code was written by Yotam Granov
+
+import numpy as np
+
+# the supported point sequences
+SEQUENCES = ['uniform', 'halton', 'sobol', 'stratified']
+
+class SampleSequence(object):
+    def __init__(self, sequence='uniform', dim=2, seed=None, scramble=True, skip=0, block_size=256):
+        '''
+        A sequence of points in the unit hypercube, drawn either independently ('uniform'), from a low-discrepancy sequence
+        ('halton' or 'sobol', which fill the space evenly instead of clumping), or from a jittered grid ('stratified', one uniform
+        point in each cell of a grid, with the cells in random order). Points are generated in blocks and handed out in order.
+        @param sequence One of SEQUENCES.
+        @param dim The dimension of the points.
+        @param seed Seed (or np.random.Generator) used for the uniform draws, the scrambling and the jitter.
+        @param scramble If True, randomly scramble the Halton/Sobol sequences (otherwise they are deterministic).
+        @param skip The number of initial points of the sequence to skip.
+        @param block_size The number of points generated at a time (rounded up to a power of two for Sobol, and to a full grid
+                          of strata for the stratified sequence).
+        '''
+        if sequence not in SEQUENCES:
+            raise ValueError('Unknown sample sequence: {}'.format(sequence))
+        self.sequence = sequence
+        self.dim = dim
+        self.rng = np.random.default_rng(seed)
+        self.block = np.zeros((0, dim))
+
+        if sequence in ('halton', 'sobol'):
+            from scipy.stats import qmc
+            if sequence == 'halton':
+                self.engine = qmc.Halton(d=dim, scramble=scramble, seed=self.rng)
+            else:
+                # Sobol points keep their balance properties in blocks of powers of two
+                self.engine = qmc.Sobol(d=dim, scramble=scramble, seed=self.rng)
+                block_size = 1 << int(np.ceil(np.log2(max(block_size, 1))))
+            if skip > 0:
+                self.engine.fast_forward(skip)
+        elif sequence == 'stratified':
+            self.strata = max(1, int(np.ceil(block_size ** (1 / dim))))
+            block_size = self.strata ** dim
+        self.block_size = block_size
+        if sequence in ('uniform', 'stratified'):
+            self.draw(skip)
+
+    def generate_block(self):
+        '''
+        Generate the next block of points (of the stratified or low-discrepancy sequences).
+        '''
+        if self.sequence == 'stratified':
+            cells = np.stack(np.unravel_index(self.rng.permutation(self.block_size), (self.strata,) * self.dim), axis=1)
+            return (cells + self.rng.uniform(size=cells.shape)) / self.strata
+        return self.engine.random(self.block_size)
+
+    def draw(self, n):
+        '''
+        Return the next n points of the sequence, as an n x dim array.
+        @param n The number of points to draw.
+        '''
+        # independent uniform points need no buffering, and are drawn directly (as single draws from the generator)
+        if self.sequence == 'uniform':
+            return self.rng.uniform(size=(n, self.dim))
+        while len(self.block) < n:
+            self.block = np.concatenate([self.block, self.generate_block()])
+        points, self.block = self.block[:n], self.block[n:]
+        return points
+
+    def draw_in_box(self, n, low, high):
+        '''
+        Return the next n points of the sequence, scaled to the given box.
+        @param n The number of points to draw.
+        @param low The lower corner of the box.
+        @param high The upper corner of the box.
+        '''
+        low, high = np.asarray(low, dtype=float), np.asarray(high, dtype=float)
+        return low + (high - low) * self.draw(n)
@@ -0,0 +1,135 @@
+# This code was written by Yotam Granov
+
+# Compares the sample sequences (uniform, Halton, Sobol, stratified) by the number of samples each planner needs for a solution:
+# the iterations of RRT and RRT* (every iteration draws one sample), and the smallest roadmap (doubling from --prm-min-samples)
+# with which PRM connects the start and goal of randomly generated circle-obstacle problems.
+# Run from the TA#10 directory: python -m RRT.SamplerBenchmark --maps RRT/map1.json --seeds 10 --json samplers.json
+
+import os, io, sys, json, time, argparse, contextlib
+import numpy as np
+from RRT.MapEnvironment import MapEnvironment
+from RRT.RRTPlanner import RRTPlanner
+from RRT.RRTStarPlanner import RRTStarPlanner
+from RRT.SampleSequence import SampleSequence, SEQUENCES
+from RRT.RRTBenchmark import summarize, to_json
+
+CONFIG_FIELDS = ['problem', 'planner', 'sequence']
+METRICS = ['num_samples', 'time', 'cost']
+
+def run_rrt(planning_env, map_file, planner, sequence, seed, args):
+    '''
+    Run RRT or RRT* quietly with the given sample sequence, and return its record.
+    '''
+    if planner == 'rrt':
+        rrt = RRTPlanner(planning_env=planning_env, ext_mode=args.ext_mode, goal_prob=args.goal_prob, seed=seed, sequence=sequence)
+    else:
+        rrt = RRTStarPlanner(planning_env=planning_env, ext_mode=args.ext_mode, goal_prob=args.goal_prob, k=args.k, seed=seed, sequence=sequence)
+    with contextlib.redirect_stdout(io.StringIO()):
+        plan = rrt.plan(max_iter=args.max_iter)
+    return {'problem': map_file, 'planner': planner, 'sequence': sequence, 'seed': seed, 'success': len(plan) > 0,
+            'num_samples': rrt.stats['num_iter'], 'time': rrt.stats['time'], 'cost': rrt.stats['cost']}
+
+def create_prm_problem(problem_seed):
+    '''
+    Create a random PRM problem (as in PRM_Main): circular obstacles, and a start and goal outside of them.
+    '''
+    from PRM_Geometry import Map, Obstacle
+    rng = np.random.default_rng(problem_seed)
+    obstacles = []
+    for _ in range(rng.integers(5, 21)):
+        r = int(rng.integers(2, 11))
+        obstacles.append(Obstacle(r, [int(rng.integers(r, 101-r)), int(rng.integers(r, 101-r))]))
+    def free_point():
+        while True:
+            point = rng.integers(0, 101, size=2)
+            if all(np.linalg.norm(point - o.center) > o.radius for o in obstacles):
+                return point.tolist()
+    return Map(), obstacles, free_point(), free_point()
+
+def run_prm(problem, problem_name, sequence, seed, args):
+    '''
+    Build PRM roadmaps of doubling sizes from the given sample sequence until one connects the start and goal, and return its record.
+    '''
+    from PRM_Geometry import Node, Start_Node, Goal_Node, Euclidean_Distance
+    from PRM_MotionPlanner import Create_Samples, Create_Roadmap, PRM_Solve
+    map, obstacles, start, goal = problem
+    start_time = time.time()
+    num_samples = args.prm_min_samples; traj = None
+    while num_samples <= args.prm_max_samples:
+        with contextlib.redirect_stdout(io.StringIO()):
+            samples = Create_Samples(map, obstacles, N_samples=num_samples, N_knn=min(3, len(obstacles)), sequence=sequence, seed=seed)
+            roadmap, PRM_graph = Create_Roadmap(samples, obstacles, N_knn=5)
+            traj = PRM_Solve(Start_Node(start), Goal_Node(goal), samples, roadmap, PRM_graph, obstacles)
+        # PRM_Solve returns the trajectory as a list, or a pair of Nones if no path was found
+        if isinstance(traj, list):
+            break
+        num_samples *= 2
+    success = isinstance(traj, list)
+    nodes = [o for o in traj if isinstance(o, Node)] if success else []
+    cost = sum(Euclidean_Distance(nodes[i].center, nodes[i+1].center) for i in range(len(nodes)-1)) if success else np.inf
+    return {'problem': problem_name, 'planner': 'prm', 'sequence': sequence, 'seed': seed, 'success': success,
+            'num_samples': num_samples if success else np.inf, 'time': time.time() - start_time, 'cost': float(cost)}
+
+def get_discrepancies(sequences, num_points=256, seed=0):
+    '''
+    Return the centered L2 discrepancy of the first points of each sequence (lower means more even coverage of the unit square).
+    '''
+    from scipy.stats import qmc
+    return {sequence: float(qmc.discrepancy(SampleSequence(sequence, dim=2, seed=seed).draw(num_points))) for sequence in sequences}
+
+def print_summary(summary, discrepancies):
+    '''
+    Print the summary as a table, followed by the discrepancy of each sequence.
+    '''
+    print('{:<18} {:<8} {:<11} {:>8} {:>18} {:>18} {:>16}'.format(
+        'problem', 'planner', 'sequence', 'success', 'samples (IQR)', 'time [s] (IQR)', 'cost (IQR)'))
+    for row in summary:
+        print('{:<18} {:<8} {:<11} {:>8.0%} {:>9.0f} ({:>6.0f}) {:>9.3f} ({:>6.3f}) {:>8.3f} ({:>5.3f})'.format(
+            os.path.basename(row['problem']), row['planner'], row['sequence'], row['success_rate'], row['num_samples_median'],
+            row['num_samples_iqr'], row['time_median'], row['time_iqr'], row['cost_median'], row['cost_iqr']))
+    print()
+    for sequence, discrepancy in discrepancies.items():
+        print('{:<11} centered L2 discrepancy of 256 points: {:.2e}'.format(sequence, discrepancy))
+
+def main():
+    parser = argparse.ArgumentParser(description='Samples-to-solution benchmark of the sample sequences for RRT, RRT* and PRM.')
+    parser.add_argument('--maps', nargs='+', default=['RRT/map1.json'])
+    parser.add_argument('--planners', nargs='+', default=['rrt', 'rrtstar', 'prm'], choices=['rrt', 'rrtstar', 'prm'])
+    parser.add_argument('--sequences', nargs='+', default=SEQUENCES, choices=SEQUENCES)
+    parser.add_argument('--seeds', type=int, default=10)
+    parser.add_argument('--ext-mode', default='E2', choices=['E1', 'E2'])
+    parser.add_argument('--goal-prob', type=float, default=0.05)
+    parser.add_argument('--k', type=int, default=5, help='k for RRT* (0 for the log mode)')
+    parser.add_argument('--max-iter', type=int, default=20000, help='RRT runs that do not reach the goal within this budget count as failures')
+    parser.add_argument('--prm-problems', type=int, default=3, help='the number of random PRM problems')
+    parser.add_argument('--prm-min-samples', type=int, default=25)
+    parser.add_argument('--prm-max-samples', type=int, default=800)
+    parser.add_argument('--json', default=None, help='path of a JSON file to write the per-run records and the summary to')
+    args = parser.parse_args()
+
+    records = []
+    rrt_planners = [planner for planner in args.planners if planner != 'prm']
+    for map_file in (args.maps if rrt_planners else []):
+        planning_env = MapEnvironment(json_file=map_file, headless=True)
+        for planner in rrt_planners:
+            for sequence in args.sequences:
+                for seed in range(args.seeds):
+                    records.append(run_rrt(planning_env, map_file, planner, sequence, seed, args))
+    if 'prm' in args.planners:
+        for problem_seed in range(args.prm_problems):
+            problem = create_prm_problem(problem_seed)
+            for sequence in args.sequences:
+                for seed in range(args.seeds):
+                    records.append(run_prm(problem, 'prm-problem-{}'.format(problem_seed), sequence, seed, args))
+
+    summary = summarize(records, config_fields=CONFIG_FIELDS, metrics=METRICS)
+    discrepancies = get_discrepancies(args.sequences)
+    print_summary(summary, discrepancies)
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(to_json({'records': records, 'summary': summary, 'discrepancies': discrepancies}), f, indent=2)
+
+if __name__ == '__main__':
+    # the PRM modules are imported by name from their own directory
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'PRM'))
+    main()
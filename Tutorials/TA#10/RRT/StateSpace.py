@@ -0,0 +1,89 @@
+# This code was written by Yotam Granov
+
+import math
+import numpy as np
+
+class StateSpace(object):
+    def __init__(self, low, high, weights=None, angular=None, step_size=0.2):
+        '''
+        A box of N-dimensional states (e.g. the joint angles of an arm) with a weighted Euclidean distance, where the angular
+        dimensions wrap around (so the distance between -pi+e and pi-e is 2e). All functions are vectorized over leading dimensions.
+        @param low The lower bound of each dimension (for the angular ones, the start of their period, e.g. -pi).
+        @param high The upper bound of each dimension (for the angular ones, the end of their period, e.g. pi).
+        @param weights The weight of each dimension in the distance (all ones by default).
+        @param angular A boolean mask of the angular dimensions (none by default).
+        @param step_size The length of E2 extensions in this space (in the units of the distance).
+        '''
+        self.low, self.high = np.asarray(low, dtype=float), np.asarray(high, dtype=float)
+        self.dim = len(self.low)
+        self.weights = np.ones(self.dim) if weights is None else np.asarray(weights, dtype=float)
+        self.angular = np.zeros(self.dim, dtype=bool) if angular is None else np.asarray(angular, dtype=bool)
+        self.period = self.high - self.low
+        self.step_size = step_size
+
+    def wrap(self, states):
+        '''
+        Map the angular dimensions of the given states into their periods.
+        @param states An array of states (the last axis holds the dimensions).
+        '''
+        states = np.asarray(states, dtype=float)
+        return np.where(self.angular, self.low + np.mod(states - self.low, self.period), states)
+
+    def difference(self, states1, states2):
+        '''
+        Return the shortest differences (states2 - states1), going around the angular dimensions the short way.
+        @param states1 An array of source states.
+        @param states2 An array of target states.
+        '''
+        diff = np.asarray(states2, dtype=float) - np.asarray(states1, dtype=float)
+        return np.where(self.angular, np.mod(diff + self.period / 2, self.period) - self.period / 2, diff)
+
+    def get_norms(self, diffs):
+        '''
+        Return the weighted norms of the given differences.
+        @param diffs An array of differences between states.
+        '''
+        return np.sqrt(np.sum(self.weights * np.square(diffs), axis=-1))
+
+    def compute_distances(self, states1, states2):
+        '''
+        Return the distances between the given states (broadcast against each other, e.g. all tree vertices against a single state).
+        @param states1 An array of states.
+        @param states2 An array of states.
+        '''
+        return self.get_norms(self.difference(states1, states2))
+
+    def steer(self, state1, state2, step_size):
+        '''
+        Return the state at most step_size away from state1 towards state2 (state2 itself if it is closer), and the distance between them.
+        @param state1 The source state.
+        @param state2 The target state.
+        @param step_size The maximal distance to move.
+        '''
+        diff = self.difference(state1, state2)
+        dist = float(self.get_norms(diff))
+        if dist <= step_size:
+            return np.array(state2, dtype=float), dist
+        return self.wrap(np.asarray(state1, dtype=float) + step_size / dist * diff), dist
+
+    def interpolate(self, state1, state2, num_points):
+        '''
+        Return num_points states evenly spaced along the shortest path from state1 to state2 (both included).
+        @param state1 The source state.
+        @param state2 The target state.
+        @param num_points The number of states (at least 2).
+        '''
+        t = np.linspace(0, 1, num_points)[:,None]
+        return self.wrap(np.asarray(state1, dtype=float) + t * self.difference(state1, state2))
+
+    def get_volume(self):
+        '''
+        Return the volume of the space, measured in the units of the (weighted) distance.
+        '''
+        return float(np.prod(self.period * np.sqrt(self.weights)))
+
+    def get_unit_ball_volume(self):
+        '''
+        Return the volume of the unit ball in this dimension.
+        '''
+        return math.pi ** (self.dim / 2) / math.gamma(self.dim / 2 + 1)
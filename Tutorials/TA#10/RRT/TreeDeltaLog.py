@@ -0,0 +1,106 @@
+# This code was written by Yotam Granov
+
+import numpy as np
+
+# the arrays of a tree delta, in the order in which they are stored in the log
+DELTA_ARRAYS = ['new_ids', 'new_states', 'new_parents', 'rewired_ids', 'rewired_parents', 'removed_ids', 'plan']
+
+class TreeDeltaLog(object):
+    def __init__(self, log_file, mode='r'):
+        '''
+        An append-only binary log of tree deltas (as yielded by the planners' plan_deltas). Each delta is stored as a short header
+        (iteration, cost, done) followed by its arrays in the .npy format, so the log can be written while planning and read back
+        one delta at a time.
+        @param log_file The path of the log file.
+        @param mode 'w' to create a new log, 'a' to append to an existing one, or 'r' to read it.
+        '''
+        if mode not in ('r', 'w', 'a'):
+            raise ValueError('Unknown log mode: {}'.format(mode))
+        self.log_file = log_file
+        self.mode = mode
+        self.file = open(log_file, mode + 'b')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def write(self, delta):
+        '''
+        Append a tree delta to the log.
+        @param delta The tree delta.
+        '''
+        np.save(self.file, np.array([delta['iteration'], delta['cost'], delta['done']], dtype=float), allow_pickle=False)
+        for name in DELTA_ARRAYS:
+            np.save(self.file, delta[name], allow_pickle=False)
+
+    def __iter__(self):
+        '''
+        Iterate over the tree deltas in the log, in order.
+        '''
+        while True:
+            try:
+                header = np.load(self.file, allow_pickle=False)
+            except (EOFError, ValueError):
+                # the end of the log (or a delta whose writing was interrupted)
+                return
+            iteration, cost, done = header
+            delta = {'iteration': int(iteration), 'cost': float(cost), 'done': bool(done)}
+            for name in DELTA_ARRAYS:
+                delta[name] = np.load(self.file, allow_pickle=False)
+            yield delta
+
+class TreeReplay(object):
+    def __init__(self, dim=2):
+        '''
+        Rebuilds a tree from its deltas, keeping only its current state (the states and parent IDs of the live vertices).
+        @param dim The dimension of the states.
+        '''
+        self.states = np.zeros((0, dim))
+        self.parents = np.zeros(0, dtype=np.int64)
+        self.alive = np.zeros(0, dtype=bool)
+        self.iteration = 0
+        self.cost = np.inf
+        self.plan = None
+
+    def apply(self, delta):
+        '''
+        Apply a tree delta.
+        @param delta The tree delta.
+        '''
+        if len(delta['new_ids']) > 0 and delta['new_ids'].max() >= len(self.parents):
+            # grow the arrays to hold the new vertex IDs (geometrically, to keep the copies amortized)
+            size = max(int(delta['new_ids'].max()) + 1, 2 * len(self.parents))
+            self.states = np.concatenate([self.states, np.zeros((size - len(self.states), self.states.shape[1]))])
+            self.parents = np.concatenate([self.parents, np.full(size - len(self.parents), -1, dtype=np.int64)])
+            self.alive = np.concatenate([self.alive, np.zeros(size - len(self.alive), dtype=bool)])
+        self.states[delta['new_ids']] = delta['new_states']
+        self.parents[delta['new_ids']] = delta['new_parents']
+        self.alive[delta['new_ids']] = True
+        self.parents[delta['rewired_ids']] = delta['rewired_parents']
+        self.alive[delta['removed_ids']] = False
+        self.iteration, self.cost = delta['iteration'], delta['cost']
+        if delta['done']:
+            self.plan = delta['plan']
+
+    def get_edges_as_states(self):
+        '''
+        Return the edges of the current tree as an array of pairs of states (positions), e.g. for MapEnvironment.visualize_map.
+        '''
+        child_ids = np.nonzero(self.alive & (self.parents >= 0))[0]
+        return np.stack([self.states[self.parents[child_ids]], self.states[child_ids]], axis=1)
+
+    def replay(self, log_file):
+        '''
+        A generator which applies the deltas of a log one by one, yielding the iteration number after each of them
+        (e.g. to render a frame of the tree growth).
+        @param log_file The path of the log file.
+        '''
+        with TreeDeltaLog(log_file) as log:
+            for delta in log:
+                self.apply(delta)
+                yield self.iteration